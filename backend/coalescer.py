@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+
+from sqlalchemy import Engine
+from sqlmodel import Session
+
+from backend import database as db
+
+
+class _PendingMessage:
+    __slots__ = ("chat_id", "text", "user_id", "created_at", "future")
+
+    def __init__(self, chat_id: int, text: str, user_id: int):
+        self.chat_id = chat_id
+        self.text = text
+        self.user_id = user_id
+        self.created_at = datetime.now()
+        self.future: Future = Future()
+
+
+class MessageCoalescer:
+    """
+    Group commit for new messages.
+
+    Posts are queued and written by a single flusher thread, which waits up
+    to `window_seconds` after the first queued message (or until `max_batch`
+    messages are queued) and then inserts the whole group in one transaction.
+    Under load that turns one commit, and so one fsync, per message into one
+    per group, at the cost of up to `window_seconds` of added latency.
+    """
+
+    def __init__(self, engine: Engine, window_seconds: float, max_batch: int):
+        self.engine = engine
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self._condition = threading.Condition()
+        self._pending: list[_PendingMessage] = []
+        self._flusher: threading.Thread = None
+
+        self.batches = 0
+        self.messages = 0
+
+    def submit(self, chat_id: int, text: str, user_id: int) -> Future:
+        """
+        Queues a new message for the next group commit
+
+        :return: a future resolving to the MessageResponse, or raising the
+            EntityNotFoundException, that database.new_message would have
+        """
+        pending = _PendingMessage(chat_id, text, user_id)
+        with self._condition:
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._run,
+                    name="message-coalescer",
+                    daemon=True,
+                )
+                self._flusher.start()
+            self._pending.append(pending)
+            self._condition.notify()
+        return pending.future
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "pending": len(self._pending),
+                "batches": self.batches,
+                "messages": self.messages,
+            }
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                deadline = time.monotonic() + self.window_seconds
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+
+            # callers that gave up waiting are dropped from the group
+            batch = [pending for pending in batch if pending.future.set_running_or_notify_cancel()]
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch: list[_PendingMessage]):
+        try:
+            with Session(self.engine) as session:
+                results = db.new_message_group(session, [
+                    (pending.chat_id, pending.text, pending.user_id, pending.created_at)
+                    for pending in batch
+                ])
+        except Exception as exception:
+            for pending in batch:
+                pending.future.set_exception(exception)
+            return
+
+        with self._condition:
+            self.batches += 1
+            self.messages += len(batch)
+        for pending, result in zip(batch, results):
+            if isinstance(result, Exception):
+                pending.future.set_exception(result)
+            else:
+                pending.future.set_result(result)
+
+
+# off unless a window is configured, e.g. MESSAGE_GROUP_COMMIT_MS=5
+group_commit_ms = float(os.environ.get("MESSAGE_GROUP_COMMIT_MS", 0))
+message_coalescer = MessageCoalescer(
+    db.engine,
+    window_seconds=group_commit_ms / 1000,
+    max_batch=int(os.environ.get("MESSAGE_GROUP_COMMIT_MAX", 100)),
+) if group_commit_ms > 0 else None
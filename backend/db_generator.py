@@ -0,0 +1,249 @@
+"""
+Generates a synthetic dataset shaped like production traffic, without any
+real user content, for benchmarks and index experiments.
+
+- chat sizes follow a power law: a few chats hold most of the messages
+- a few hot users write most of the messages and sit in the most chats
+- member counts and message lengths are long-tailed
+
+The same seed always produces the same rows, so runs against generated data
+are comparable. Rows are written in chunks through the seeder's INSERT ..
+ON CONFLICT DO NOTHING, so generating into a database that already holds the
+same dataset is a no-op. It is meant for an empty database.
+
+    python -m backend.db_generator --users 10000 --chats 2000 --messages 1000000 --seed 1
+"""
+import argparse
+import bisect
+import itertools
+import json
+import math
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlalchemy import Engine
+from sqlmodel import Session, SQLModel
+
+from backend.database import (
+    bump_all_entity_versions,
+    engine,
+    insert_ignoring_conflicts,
+    pause_message_search_index,
+    rebuild_message_search_index,
+    reconcile_chat_stats,
+)
+from backend.db_seeder import SEED_CHUNK_SIZE, print_progress, sync_sequences
+from backend.schema import ChatInDB, MessageInDB, UserChatLinkInDB, UserInDB
+
+DEFAULT_PASSWORD = "password"
+MAX_MESSAGE_WORDS = 500
+MESSAGE_CORPUS_WORDS = 100_000
+
+# filler words, so message text has realistic lengths but no real content
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud "
+    "exercitation ullamco laboris nisi aliquip ex ea commodo consequat duis aute irure "
+    "in reprehenderit voluptate velit esse cillum fugiat nulla pariatur excepteur sint "
+    "occaecat cupidatat non proident sunt culpa qui officia deserunt mollit anim id est"
+).split()
+
+BCRYPT_SALT_CHARACTERS = "./ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+
+
+def zipf_weights(count: int, skew: float) -> list[float]:
+    """Weights of `count` items, the item of rank r weighing 1 / r**skew"""
+    return [1 / rank ** skew for rank in range(1, count + 1)]
+
+
+def _pick(items: list, cum_weights: list[float], rng: random.Random):
+    return items[bisect.bisect(cum_weights, rng.random() * cum_weights[-1])]
+
+
+def _hash_password(password: str, rng: random.Random) -> str:
+    # bcrypt salts itself randomly; a salt drawn from the seed keeps the rows reproducible
+    from passlib.hash import bcrypt
+
+    salt = "".join(rng.choices(BCRYPT_SALT_CHARACTERS, k=21)) + "e"
+    return bcrypt.using(salt=salt, rounds=12).hash(password)
+
+
+def _write(target: Engine, model, rows: list[dict]):
+    with Session(target) as session:
+        session.exec(insert_ignoring_conflicts(session, model.__table__), params=rows)
+        session.commit()
+
+
+def generate_database(
+    target: Engine = engine,
+    users: int = 10_000,
+    chats: int = 1_000,
+    messages: int = 1_000_000,
+    seed: int = 0,
+    chat_skew: float = 1.1,
+    user_skew: float = 1.0,
+    min_members: int = 2,
+    member_alpha: float = 1.2,
+    median_words: int = 8,
+    start: datetime = datetime(2023, 1, 1),
+    days: int = 365,
+    password: str = DEFAULT_PASSWORD,
+    chunk_size: int = SEED_CHUNK_SIZE,
+    progress: Callable = print_progress,
+) -> dict:
+    """
+    Generates users, chats, memberships and messages into the target database
+
+    :param seed: the random seed every row is derived from
+    :param chat_skew: the Zipf exponent of messages per chat, 0 for uniform
+    :param user_skew: the Zipf exponent of user activity, 0 for uniform
+    :param min_members: the fewest members a chat has, owner included
+    :param member_alpha: the Pareto shape of member counts; lower is longer tailed
+    :param median_words: the median message length; lengths are log-normal
+    :param start: when the first user signs up, messages follow over `days`
+    :param password: the password of every generated user, e.g. for logging in
+    :param chunk_size: the number of rows inserted per transaction
+    :return: the number of rows generated per table
+    """
+    rng = random.Random(seed)
+    SQLModel.metadata.create_all(target)
+    hashed_password = _hash_password(password, rng)
+    span = timedelta(days=days)
+
+    # user 1 is the most active; chats are shuffled so the biggest don't all have small ids
+    user_ids = list(range(1, users + 1))
+    activity = zipf_weights(users, user_skew)
+    user_weights = list(itertools.accumulate(activity))
+    chat_ids = list(range(1, chats + 1))
+    rng.shuffle(chat_ids)
+    chat_weights = list(itertools.accumulate(zipf_weights(chats, chat_skew)))
+
+    def write_chunks(model, rows, total: int):
+        started_at = time.perf_counter()
+        count = 0
+        for chunk in iter(lambda: list(itertools.islice(rows, chunk_size)), []):
+            _write(target, model, chunk)
+            count += len(chunk)
+            progress(model.__tablename__, count, total, time.perf_counter() - started_at)
+        return count
+
+    counts = {}
+    counts["users"] = write_chunks(UserInDB, (
+        {
+            "id": user_id,
+            "username": f"user{user_id}",
+            "email": f"user{user_id}@example.com",
+            "hashed_password": hashed_password,
+            "created_at": start + span * user_id / users / 10,
+        }
+        for user_id in user_ids
+    ), users)
+
+    # hot users sit in more chats, since members are drawn by activity
+    members = {}
+    for chat_id in range(1, chats + 1):
+        # capped, as drawing all but the coldest users by activity takes long
+        size = min(max(1, users // 2), int(min_members * rng.paretovariate(member_alpha)))
+        chosen = {_pick(user_ids, user_weights, rng)}
+        while len(chosen) < size:
+            chosen.update(rng.choices(user_ids, cum_weights=user_weights, k=size - len(chosen)))
+        members[chat_id] = sorted(chosen)
+    owners = {chat_id: rng.choice(chat_members) for chat_id, chat_members in members.items()}
+
+    counts["chats"] = write_chunks(ChatInDB, (
+        {
+            "id": chat_id,
+            "name": f"chat {chat_id}",
+            "owner_id": owners[chat_id],
+            "created_at": start + span * chat_id / chats / 10,
+        }
+        for chat_id in range(1, chats + 1)
+    ), chats)
+    counts["user_chat_links"] = write_chunks(UserChatLinkInDB, (
+        {"user_id": user_id, "chat_id": chat_id}
+        for chat_id, chat_members in members.items()
+        for user_id in chat_members
+    ), sum(len(chat_members) for chat_members in members.values()))
+
+    # within a chat, authors are drawn by their activity as well
+    author_weights = {
+        chat_id: list(itertools.accumulate(activity[user_id - 1] for user_id in chat_members))
+        for chat_id, chat_members in members.items()
+    }
+    log_median = math.log(median_words)
+    # message texts are cut from one long run of random words, rather than
+    # drawing every word of every message
+    corpus = rng.choices(WORDS, k=MESSAGE_CORPUS_WORDS)
+
+    def message_rows():
+        first_at = start + span / 10
+        for message_id in range(1, messages + 1):
+            chat_id = _pick(chat_ids, chat_weights, rng)
+            author = _pick(members[chat_id], author_weights[chat_id], rng)
+            words = min(MAX_MESSAGE_WORDS, max(1, int(rng.lognormvariate(log_median, 1.0))))
+            offset = rng.randrange(MESSAGE_CORPUS_WORDS - words)
+            yield {
+                "id": message_id,
+                "text": " ".join(corpus[offset:offset + words]),
+                "chat_id": chat_id,
+                "user_id": author,
+                "created_at": first_at + span * 0.9 * message_id / messages,
+            }
+
+    # indexing the whole table once at the end is several times faster than
+    # the trigger indexing every inserted row
+    with target.begin() as connection:
+        pause_message_search_index(connection)
+    try:
+        counts["messages"] = write_chunks(MessageInDB, message_rows(), messages)
+    finally:
+        with target.begin() as connection:
+            rebuild_message_search_index(connection)
+
+    if target.dialect.name == "postgresql":
+        sync_sequences(target)
+    with Session(target) as session:
+        reconcile_chat_stats(session)
+        bump_all_entity_versions(session)
+        session.commit()
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--chats", type=int, default=1_000)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chat-skew", type=float, default=1.1)
+    parser.add_argument("--user-skew", type=float, default=1.0)
+    parser.add_argument("--min-members", type=int, default=2)
+    parser.add_argument("--member-alpha", type=float, default=1.2)
+    parser.add_argument("--median-words", type=int, default=8)
+    parser.add_argument("--chunk-size", type=int, default=SEED_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    result = generate_database(
+        engine,
+        users=args.users,
+        chats=args.chats,
+        messages=args.messages,
+        seed=args.seed,
+        chat_skew=args.chat_skew,
+        user_skew=args.user_skew,
+        min_members=args.min_members,
+        member_alpha=args.member_alpha,
+        median_words=args.median_words,
+        chunk_size=args.chunk_size,
+    )
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,142 +1,240 @@
+"""
+Copies the users, chats, messages and chat memberships of the seed database
+(backend/initial.db) into the app's database.
+
+Rows are streamed in primary key order, `chunk_size` at a time, and written
+with INSERT .. ON CONFLICT DO NOTHING, so memory use is bounded by a chunk and
+rows that already exist are left alone. With a checkpoint file the position of
+every table is saved after each chunk, and an interrupted run picks up where
+it stopped.
+
+    python -m backend.db_seeder --chunk-size 10000 --checkpoint seed.json
+"""
+import argparse
 import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Optional
 
-from sqlalchemy import func
-from sqlmodel import Session, create_engine, select
+from sqlalchemy import Engine, MetaData, func, inspect, tuple_
+from sqlmodel import Session, SQLModel, create_engine, select
 
 from backend.schema import *
-from backend.database import engine
-
-SQLModel.metadata.create_all(engine)
+from backend.database import (
+    bump_all_entity_versions,
+    engine,
+    insert_ignoring_conflicts,
+    reconcile_chat_stats,
+)
 
 local_engine = create_engine(
     "sqlite:///backend/initial.db",
     connect_args={"check_same_thread": False},
 )
 
+SEED_CHUNK_SIZE = int(os.environ.get("SEED_CHUNK_SIZE", 10_000))
 
-def upsert_all(session, cls, local_models) -> int:
-    models = session.exec(select(cls)).all()
-    model_lookup = {model.id: model for model in models}
-    count = 0
-    for local_model in local_models:
-        if model_lookup.get(local_model.id) is None:
-            session.add(cls(**{
-                key: value
-                for key, value in local_model.model_dump().items()
-                if key != "id"
-            }))
-            count += 1
-    session.commit()
-    return count
-
-
-def upsert_links(session, local_models) -> int:
-    links = session.exec(select(UserChatLinkInDB)).all()
-    link_lookup = {(link.user_id, link.chat_id): link for link in links}
-    count = 0
-    for local_model in local_models:
-        if link_lookup.get((local_model.user_id, local_model.chat_id)) is None:
-            session.add(UserChatLinkInDB(**local_model.model_dump()))
-            count += 1
-    session.commit()
-    return count
+# parents before children, so foreign keys always point at copied rows
+SEEDED_MODELS = [UserInDB, ChatInDB, MessageInDB, UserChatLinkInDB]
 
 
-def get_count(session, model):
-    if model == UserChatLinkInDB:
-        return session.scalar(select(func.count(model.user_id)))
-    return session.scalar(select(func.count(model.id)))
-
+def print_progress(table: str, copied: int, total: int, seconds: float):
+    rate = copied / seconds if seconds else 0
+    print(f"{table}: {copied}/{total} rows ({rate:.0f} rows/s)", file=sys.stderr)
 
-def add_users() -> dict[str, int]:
-    with Session(local_engine) as local_session:
-        users = local_session.exec(select(UserInDB)).all()
-        local_count = len(users)
 
-    with Session(engine) as session:
-        prev_count = get_count(session, UserInDB)
-        additions = upsert_all(session, UserInDB, users)
-        count = get_count(session, UserInDB)
+class Checkpoint:
+    """The last primary key copied from every table, saved to a json file."""
 
-    return {
-        "local": local_count,
-        "prev": prev_count,
-        "additions": additions,
-        "final": count,
-    }
+    def __init__(self, path: Optional[str]):
+        self.path = Path(path) if path else None
+        self.positions = {}
+        if self.path and self.path.exists():
+            self.positions = json.loads(self.path.read_text())
 
+    def get(self, table: str) -> Optional[list]:
+        return self.positions.get(table)
 
-def add_chats() -> dict[str, int]:
-    with Session(local_engine) as local_session:
-        chats = local_session.exec(select(ChatInDB)).all()
-        local_count = len(chats)
+    def save(self, table: str, position: list):
+        self.positions[table] = position
+        if self.path:
+            self.path.write_text(json.dumps(self.positions))
 
-    with Session(engine) as session:
-        prev_count = get_count(session, ChatInDB)
-        additions = upsert_all(session, ChatInDB, chats)
-        count = get_count(session, ChatInDB)
+    def clear(self):
+        self.positions = {}
+        if self.path:
+            self.path.unlink(missing_ok=True)
 
-    return {
-        "local": local_count,
-        "prev": prev_count,
-        "additions": additions,
-        "final": count,
-    }
 
-
-def add_messages() -> dict[str, int]:
-    with Session(local_engine) as local_session:
-        messages = local_session.exec(select(MessageInDB)).all()
-        local_count = len(messages)
-
-    with Session(engine) as session:
-        prev_count = get_count(session, MessageInDB)
-        additions = upsert_all(session, MessageInDB, messages)
-        count = get_count(session, MessageInDB)
+def get_count(session, model):
+    return session.scalar(select(func.count()).select_from(model))
+
+
+def _chunk_end(session: Session, primary_key: list, position: Optional[list], chunk_size: int):
+    """Finds the primary key of the last row in the next chunk, or None once done"""
+    key = tuple_(*primary_key)
+    statement = select(*primary_key)
+    if position is not None:
+        statement = statement.where(key > tuple_(*position))
+    end = session.exec(
+        statement.order_by(*primary_key).offset(chunk_size - 1).limit(1)
+    ).first()
+    if end is None:
+        # the last, partial chunk
+        end = session.exec(
+            statement.order_by(*(column.desc() for column in primary_key)).limit(1)
+        ).first()
+    if end is None:
+        return None
+    # sqlmodel returns a scalar rather than a row for a single column
+    return list(end) if len(primary_key) > 1 else [end]
+
+
+def _in_chunk(table, position: Optional[list], end: list):
+    """Matches the rows after `position`, up to and including `end`"""
+    key = tuple_(*table.primary_key.columns)
+    condition = key <= tuple_(*end)
+    if position is not None:
+        condition = condition & (key > tuple_(*position))
+    return condition
+
+
+def _can_attach(source: Engine, target: Engine) -> bool:
+    return (
+        source.dialect.name == target.dialect.name == "sqlite"
+        and source.url.database not in (None, "", ":memory:")
+    )
+
+
+def copy_table(
+    model,
+    source: Engine,
+    target: Engine,
+    chunk_size: int = SEED_CHUNK_SIZE,
+    checkpoint: Checkpoint = None,
+    progress: Callable = print_progress,
+) -> dict[str, int]:
+    """
+    Copies the rows of one table from the source database into the target
+
+    Between two SQLite files the source is attached to the target connection
+    and every chunk is copied by a single INSERT .. SELECT, so rows never pass
+    through Python; otherwise every chunk is read and then inserted in one
+    executemany.
+
+    :param model: the table model to copy
+    :param chunk_size: the number of rows read and written per transaction
+    :param checkpoint: where to resume from and to save the position to
+    :param progress: called with the table, rows copied, total rows and seconds elapsed
+    :return: the row counts of the source and of the target before and after
+    """
+    checkpoint = checkpoint or Checkpoint(None)
+    table = model.__table__
+    primary_key = list(table.primary_key.columns)
+    # the seed database may predate columns added to the app's schema since
+    source_columns = {column["name"] for column in inspect(source).get_columns(table.name)}
+    names = [column.name for column in table.columns if column.name in source_columns]
+
+    attached = _can_attach(source, target)
+    seed_table = table.to_metadata(MetaData(), schema="seed") if attached else table
+
+    with Session(source) as source_session, target.connect() as connection:
+        if attached:
+            connection.exec_driver_sql("ATTACH DATABASE ? AS seed", (source.url.database,))
+            # let the session below begin and commit its own transactions
+            connection.commit()
+        session = Session(connection)
+        try:
+            local_count = get_count(source_session, model)
+            prev_count = get_count(session, model)
+
+            position = checkpoint.get(table.name)
+            copied = 0
+            started_at = time.perf_counter()
+            while (end := _chunk_end(source_session, primary_key, position, chunk_size)) is not None:
+                source_table = seed_table if attached else table
+                rows = select(*(source_table.c[name] for name in names)).where(
+                    _in_chunk(source_table, position, end)
+                )
+                if attached:
+                    session.exec(insert_ignoring_conflicts(session, table).from_select(names, rows))
+                    copied += source_session.scalar(
+                        select(func.count()).select_from(table).where(_in_chunk(table, position, end))
+                    )
+                else:
+                    values = [dict(row) for row in source_session.exec(rows).mappings()]
+                    session.exec(insert_ignoring_conflicts(session, table), params=values)
+                    copied += len(values)
+                session.commit()
+
+                position = end
+                checkpoint.save(table.name, position)
+                progress(table.name, copied, local_count, time.perf_counter() - started_at)
+
+            count = get_count(session, model)
+        finally:
+            session.close()
+            if attached:
+                connection.exec_driver_sql("DETACH DATABASE seed")
 
     return {
         "local": local_count,
         "prev": prev_count,
-        "additions": additions,
+        "additions": count - prev_count,
         "final": count,
     }
 
 
-def add_user_chat_links() -> dict[str, int]:
-    with Session(local_engine) as local_session:
-        links = local_session.exec(select(UserChatLinkInDB)).all()
-        local_count = len(links)
-
-    with Session(engine) as session:
-        prev_count = get_count(session, UserChatLinkInDB)
-        additions = upsert_links(session, links)
-        count = get_count(session, UserChatLinkInDB)
-
-    return {
-        "local": local_count,
-        "prev": prev_count,
-        "additions": additions,
-        "final": count,
+def sync_sequences(target: Engine):
+    """Moves Postgres id sequences past ids inserted explicitly, e.g. copied from the seed database."""
+    with target.begin() as connection:
+        for model in (UserInDB, ChatInDB, MessageInDB):
+            table = model.__tablename__
+            connection.exec_driver_sql(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                f"coalesce(max(id), 0) + 1, false) FROM {table}"
+            )
+
+
+def seed_database(
+    source: Engine = local_engine,
+    target: Engine = engine,
+    chunk_size: int = SEED_CHUNK_SIZE,
+    checkpoint_path: Optional[str] = os.environ.get("SEED_CHECKPOINT"),
+    progress: Callable = print_progress,
+):
+    SQLModel.metadata.create_all(target)
+    checkpoint = Checkpoint(checkpoint_path)
+
+    counts = {
+        model.__tablename__: copy_table(model, source, target, chunk_size, checkpoint, progress)
+        for model in SEEDED_MODELS
     }
+    if target.dialect.name == "postgresql":
+        sync_sequences(target)
 
+    # the seeded rows bypass the counters maintained by the api
+    with Session(target) as session:
+        chat_stats = reconcile_chat_stats(session)
+        bump_all_entity_versions(session)
+        session.commit()
 
-def seed_database():
-    user_count = add_users()
-    chat_count = add_chats()
-    message_count = add_messages()
-    link_count = add_user_chat_links()
+    checkpoint.clear()
 
     return {
-        "user_count": user_count,
-        "chat_count": chat_count,
-        "message_count": message_count,
-        "link_count": link_count,
+        "user_count": counts["users"],
+        "chat_count": counts["chats"],
+        "message_count": counts["messages"],
+        "link_count": counts["user_chat_links"],
+        "chat_stats": chat_stats,
     }
 
 
 def lambda_handler(event, context):
     try:
-        result = seed_database()
+        result = seed_database(progress=lambda *args: None)
         return {
             "statusCode": 200,
             "body": json.dumps(result),
@@ -148,6 +246,24 @@ def lambda_handler(event, context):
         }
 
 
-if __name__ == "__main__":
-    seed_database()
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--source", help="database url to copy from, backend/initial.db by default")
+    parser.add_argument("--chunk-size", type=int, default=SEED_CHUNK_SIZE)
+    parser.add_argument(
+        "--checkpoint",
+        default=os.environ.get("SEED_CHECKPOINT"),
+        help="json file to save progress to and resume from",
+    )
+    args = parser.parse_args()
 
+    source = create_engine(args.source) if args.source else local_engine
+    result = seed_database(source, engine, args.chunk_size, args.checkpoint)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,16 @@ class Metadata(BaseModel):
     """Represents metadata for a collection"""
     count: int
 
+class PaginatedMetadata(Metadata):
+    """Represents metadata for a single page of a collection"""
+    next_cursor: Optional[int] = None
+    prev_cursor: Optional[int] = None
+
+class PageMetadata(Metadata):
+    """Represents metadata for a page of a filtered collection"""
+    next_cursor: Optional[int] = None
+    total: Optional[int] = None
+
 class UserCreate(BaseModel):
     """Represents parameters for adding a new user to the database"""
     id: int
@@ -33,14 +43,32 @@ class UserCollection(BaseModel):
     meta: Metadata
     users: list[User]
 
+class UserPage(UserCollection):
+    """Represents an API response for a single page of the user directory"""
+    meta: PageMetadata
+
 class NewMessage(BaseModel):
     text: str
 
+class MessageBatchResponse(BaseModel):
+    """Represents the messages created by a batch, in the order they were sent"""
+    meta: Metadata
+    ids: list[int]
+
+class MessagePreview(BaseModel):
+    """The start of a chat's latest message."""
+    id: int
+    text: str
+    user: User
+    created_at: datetime
+
 class Chat(BaseModel):
     id: int
     name: str
     owner: User
     created_at: datetime
+    last_activity_at: Optional[datetime] = None
+    last_message: Optional[MessagePreview] = None
 
 
 class ChatResponse(BaseModel):
@@ -51,11 +79,29 @@ class ChatCollection(BaseModel):
     meta: Metadata
     chats: list[Chat]
 
+class ChatPage(ChatCollection):
+    """Represents a single page of all chats"""
+    meta: PageMetadata
+
 class UserChatCollection(BaseModel):
     meta: Metadata
     chats: list[ChatResponse]
 
 
+class ChatUnread(BaseModel):
+    """How far a user has read a chat."""
+    chat_id: int
+    last_read_message_id: Optional[int] = None
+    unread_count: int
+
+class UnreadChatCollection(ChatCollection):
+    """A user's chats along with how many of their messages the user hasn't read."""
+    unread: list[ChatUnread]
+
+class ReadMarkerUpdate(BaseModel):
+    """Request model to mark a chat read, up to the latest message unless given."""
+    message_id: Optional[int] = None
+
 class ChatMeta(BaseModel):
     message_count: int
     user_count: int
@@ -86,6 +132,17 @@ class ChatNameUpdate(BaseModel):
 
 class MessageCollection(BaseModel):
     """Represents a collection of messages"""
-    meta: Metadata
+    meta: PaginatedMetadata
     messages: list[Message]
 
+
+class MessageSearchResult(BaseModel):
+    """Represents a message matching a search"""
+    message: Message
+    snippet: str
+    rank: float
+
+class MessageSearchCollection(BaseModel):
+    """Represents a page of message search results, best match first"""
+    meta: PaginatedMetadata
+    results: list[MessageSearchResult]
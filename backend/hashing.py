@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class HashingPoolFull(Exception):
+    """Raised when too many password hashing jobs are already pending."""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing and verification on a small dedicated thread pool.
+
+    bcrypt releases the GIL, so the pool keeps at most `max_workers` cores
+    busy with password work. At most `max_pending` jobs may be queued or
+    running; callers beyond that are rejected with HashingPoolFull rather than
+    tying up more of the request threadpool, so a login storm cannot starve
+    the other endpoints.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self._context = None
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="bcrypt",
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0  # time spent queued before a worker picked the job up
+        self.run_seconds = 0.0  # time spent hashing
+
+    @property
+    def context(self):
+        # passlib and bcrypt are imported on first use to keep them out of cold starts
+        with self._lock:
+            if self._context is None:
+                from passlib.context import CryptContext
+                self._context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+            return self._context
+
+    def hash(self, password: str) -> str:
+        return self._run(self.context.hash, password)
+
+    def verify(self, password: str, hashed_password: str) -> bool:
+        return self._run(self.context.verify, password, hashed_password)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": self._pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "wait_seconds": self.wait_seconds,
+                "run_seconds": self.run_seconds,
+            }
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise HashingPoolFull()
+            self._pending += 1
+
+        try:
+            future = self._executor.submit(self._timed, fn, time.perf_counter(), *args)
+            return future.result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _timed(self, fn, submitted_at: float, *args):
+        started_at = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            finished_at = time.perf_counter()
+            with self._lock:
+                self.completed += 1
+                self.wait_seconds += started_at - submitted_at
+                self.run_seconds += finished_at - started_at
+
+
+password_hasher = PasswordHasher(
+    max_workers=int(os.environ.get("BCRYPT_WORKERS", min(4, os.cpu_count() or 1))),
+    max_pending=int(os.environ.get("BCRYPT_MAX_PENDING", 16)),
+)
@@ -1,13 +1,20 @@
 from mangum import Mangum
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, ORJSONResponse, PlainTextResponse, Response
 from backend.routers.users import users_router
 from backend.routers.chats import chats_router
 from backend.routers.auths import auth_router
+from backend.routers.events import events_router
+from backend.routers.messages import messages_router
+from backend.routers.caching import NotModified
 from backend.database import EntityNotFoundException
 from backend.database import EntityAlreadyExistsException
 from backend.database import create_db_and_tables
+from backend.hashing import HashingPoolFull
+from backend.openapi import use_cached_openapi
+from backend.metrics import MetricsMiddleware, render_metrics
+from backend.profiling import QueryProfilerMiddleware
 from contextlib import asynccontextmanager
 
 
@@ -23,12 +30,16 @@ app = FastAPI(
     title="Pony Express",
     description="Create an API for a chat application with title \"Pony Express\" with a subset of the eventual functionality.",
     version="0.1.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 app.include_router(users_router)
 app.include_router(chats_router)
 app.include_router(auth_router)
+app.include_router(events_router)
+app.include_router(messages_router)
+use_cached_openapi(app)
 
 app.add_middleware(
     CORSMiddleware,
@@ -37,6 +48,9 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(QueryProfilerMiddleware)
+# outermost, so the recorded latency covers the other middleware too
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/", include_in_schema=False)
 def default() -> str:
@@ -52,6 +66,14 @@ def default() -> str:
     )
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics() -> str:
+    return PlainTextResponse(
+        content=render_metrics(),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
 @app.exception_handler(EntityNotFoundException)
 def handle_entity_not_found(
     _request: Request,
@@ -84,4 +106,30 @@ def handle_entity_already_exists(
         },
     )
 
+@app.exception_handler(HashingPoolFull)
+def handle_hashing_pool_full(
+    _request: Request,
+    _exception: HashingPoolFull,
+) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": "1"},
+        content={
+            "detail": {
+                "type": "service_busy",
+                "description": "too many password checks in progress, retry shortly",
+            },
+        },
+    )
+
+@app.exception_handler(NotModified)
+def handle_not_modified(
+    _request: Request,
+    exception: NotModified,
+) -> Response:
+    return Response(
+        status_code=304,
+        headers={"ETag": exception.etag, "Cache-Control": "no-cache"},
+    )
+
 lambda_handler = Mangum(app)
\ No newline at end of file
@@ -0,0 +1,29 @@
+import json
+
+from sqlmodel import Session
+
+from backend.database import engine, reconcile_chat_stats
+
+
+def reconcile() -> dict[str, int]:
+    """Recounts the message and user counters of every chat."""
+    with Session(engine) as session:
+        return reconcile_chat_stats(session)
+
+
+def lambda_handler(event, context):
+    try:
+        result = reconcile()
+        return {
+            "statusCode": 200,
+            "body": json.dumps(result),
+        }
+    except Exception as e:
+        return {
+            "statusCode": 500,
+            "body": json.dumps({"error": str(e)}),
+        }
+
+
+if __name__ == "__main__":
+    print(json.dumps(reconcile()))
@@ -0,0 +1,262 @@
+"""
+Request and database metrics, served in the Prometheus text format at /metrics.
+
+Metrics are kept in process memory, so every worker or Lambda instance
+reports its own counts since it started; Prometheus sums them across
+instances.
+"""
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import Engine, event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# requests that didn't match any route share one label, so scanners probing
+# random paths can't create unbounded numbers of series
+UNMATCHED_ROUTE = "unmatched"
+
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RequestMetrics:
+    """The database work done on behalf of the current request."""
+
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+current_request: ContextVar[Optional[RequestMetrics]] = ContextVar("current_request", default=None)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight: dict[str, int] = {}
+        self.latency: dict[tuple, Histogram] = {}  # by (method, route, status)
+        self.request_queries: dict[tuple, Histogram] = {}  # by (method, route)
+        self.request_db_seconds: dict[tuple, Histogram] = {}  # by (method, route)
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    def request_started(self, method: str):
+        with self._lock:
+            self.in_flight[method] = self.in_flight.get(method, 0) + 1
+
+    def request_finished(
+        self,
+        method: str,
+        route: str,
+        status: int,
+        seconds: float,
+        request: RequestMetrics,
+    ):
+        with self._lock:
+            self.in_flight[method] -= 1
+            self._histogram(self.latency, (method, route, str(status)), LATENCY_BUCKETS).observe(seconds)
+            self._histogram(self.request_queries, (method, route), QUERY_COUNT_BUCKETS).observe(request.queries)
+            self._histogram(self.request_db_seconds, (method, route), LATENCY_BUCKETS).observe(request.db_seconds)
+
+    def query_executed(self, seconds: float):
+        with self._lock:
+            self.queries += 1
+            self.query_seconds += seconds
+
+    @staticmethod
+    def _histogram(histograms: dict, labels: tuple, buckets: tuple) -> Histogram:
+        histogram = histograms.get(labels)
+        if histogram is None:
+            histogram = histograms[labels] = Histogram(buckets)
+        return histogram
+
+    def render(self) -> str:
+        """The collected metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            _gauge(lines, "http_requests_in_flight", "Requests currently being served.", {
+                (("method", method),): count for method, count in sorted(self.in_flight.items())
+            })
+            _histograms(lines, "http_request_duration_seconds", "Time to serve a request.", {
+                (("method", method), ("route", route), ("status", status)): histogram
+                for (method, route, status), histogram in sorted(self.latency.items())
+            })
+            _histograms(lines, "http_request_db_queries", "SQL statements executed per request.", {
+                (("method", method), ("route", route)): histogram
+                for (method, route), histogram in sorted(self.request_queries.items())
+            })
+            _histograms(lines, "http_request_db_seconds", "Time spent in SQL statements per request.", {
+                (("method", method), ("route", route)): histogram
+                for (method, route), histogram in sorted(self.request_db_seconds.items())
+            })
+            _counter(lines, "db_queries_total", "SQL statements executed, in or out of requests.", {
+                (): self.queries,
+            })
+            _counter(lines, "db_query_seconds_total", "Time spent in SQL statements.", {
+                (): self.query_seconds,
+            })
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _samples(lines: list, name: str, help: str, kind: str, samples: dict):
+    lines.append(f"# HELP {name} {help}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, value in samples.items():
+        lines.append(f"{name}{_labels(labels)} {_format(value)}")
+
+
+def _gauge(lines: list, name: str, help: str, samples: dict):
+    _samples(lines, name, help, "gauge", samples)
+
+
+def _counter(lines: list, name: str, help: str, samples: dict):
+    _samples(lines, name, help, "counter", samples)
+
+
+def _histograms(lines: list, name: str, help: str, histograms: dict):
+    lines.append(f"# HELP {name} {help}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, histogram in histograms.items():
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append(f"{name}_bucket{_labels(labels + (('le', _format(bound)),))} {count}")
+        lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+        lines.append(f"{name}_sum{_labels(labels)} {_format(histogram.sum)}")
+        lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+
+
+metrics = MetricsRegistry()
+
+
+# listening on the Engine class covers the sync engine and the engine behind
+# async_engine alike
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started_at = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started_at = getattr(context, "_metrics_started_at", None)
+    if started_at is None:
+        return
+    seconds = time.perf_counter() - started_at
+    metrics.query_executed(seconds)
+    request = current_request.get()
+    if request is not None:
+        request.queries += 1
+        request.db_seconds += seconds
+
+
+class MetricsMiddleware:
+    """
+    Records the latency, status and database work of every http request.
+
+    Requests are labelled by their route's path template (e.g.
+    /chats/{chat_id}) rather than the raw path, which FastAPI leaves in the
+    scope once it has matched the route.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry = metrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        request = RequestMetrics()
+        token = current_request.set(request)
+        self.registry.request_started(method)
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            seconds = time.perf_counter() - started_at
+            current_request.reset(token)
+            route = scope.get("route")
+            self.registry.request_finished(
+                method,
+                getattr(route, "path", UNMATCHED_ROUTE),
+                status,
+                seconds,
+                request,
+            )
+
+
+def render_metrics(registry: MetricsRegistry = metrics) -> str:
+    """The request and database metrics along with the bcrypt pool and group commit counters"""
+    from backend.coalescer import message_coalescer
+    from backend.hashing import password_hasher
+
+    lines = []
+    hashing = password_hasher.stats()
+    _gauge(lines, "bcrypt_jobs_pending", "Password hashing jobs queued or running.", {
+        (): hashing["pending"],
+    })
+    _counter(lines, "bcrypt_jobs_completed_total", "Password hashing jobs completed.", {
+        (): hashing["completed"],
+    })
+    _counter(lines, "bcrypt_jobs_rejected_total", "Password hashing jobs rejected with a 503.", {
+        (): hashing["rejected"],
+    })
+    _counter(lines, "bcrypt_wait_seconds_total", "Time hashing jobs spent queued.", {
+        (): hashing["wait_seconds"],
+    })
+    _counter(lines, "bcrypt_run_seconds_total", "Time spent hashing.", {
+        (): hashing["run_seconds"],
+    })
+    if message_coalescer is not None:
+        group_commit = message_coalescer.stats()
+        _gauge(lines, "message_group_commit_pending", "Messages waiting for the next group commit.", {
+            (): group_commit["pending"],
+        })
+        _counter(lines, "message_group_commit_batches_total", "Group commits written.", {
+            (): group_commit["batches"],
+        })
+        _counter(lines, "message_group_commit_messages_total", "Messages written by group commits.", {
+            (): group_commit["messages"],
+        })
+    return registry.render() + "\n".join(lines) + "\n"
@@ -0,0 +1,80 @@
+"""
+Prebuilt OpenAPI schema, so serverless instances don't generate it on the
+first request for the docs.
+
+    python -m backend.openapi backend/openapi.json
+
+writes the schema at build time; set OPENAPI_CACHE to that path to serve it.
+A cached schema is only used by the code it was built from: any change to the
+backend's source (a route's parameters, a response model's fields, a
+docstring), the app version or the FastAPI and pydantic versions generating
+it makes the app generate the schema again.
+"""
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Optional
+
+import fastapi
+import pydantic
+from fastapi import FastAPI
+
+
+SOURCE_ROOT = Path(__file__).resolve().parent
+
+
+def source_fingerprint(app: FastAPI, root: Path = SOURCE_ROOT) -> str:
+    """
+    Hashes everything the generated schema depends on
+
+    Hashing the source is far cheaper than generating the schema to compare,
+    which is the cost the cache avoids.
+    """
+    digest = hashlib.sha256(json.dumps([app.version, fastapi.__version__, pydantic.VERSION]).encode())
+    for source in sorted(root.rglob("*.py")):
+        digest.update(f"\0{source.relative_to(root).as_posix()}\0".encode())
+        digest.update(source.read_bytes())
+    return digest.hexdigest()
+
+
+def build_openapi(app: FastAPI) -> dict:
+    # FastAPI's own generation, even when app.openapi has been replaced
+    return FastAPI.openapi(app)
+
+
+def load_openapi(app: FastAPI, path: Path) -> Optional[dict]:
+    try:
+        cached = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+    if cached.get("fingerprint") != source_fingerprint(app):
+        return None
+    return cached["schema"]
+
+
+def write_openapi(app: FastAPI, path: Path):
+    path.write_text(json.dumps({
+        "fingerprint": source_fingerprint(app),
+        "schema": build_openapi(app),
+    }))
+
+
+def use_cached_openapi(app: FastAPI, path: Optional[str] = os.environ.get("OPENAPI_CACHE")):
+    """Makes the app serve the schema prebuilt at `path`, falling back to generating it"""
+    if not path:
+        return
+
+    def openapi() -> dict:
+        if app.openapi_schema is None:
+            app.openapi_schema = load_openapi(app, Path(path)) or build_openapi(app)
+        return app.openapi_schema
+
+    app.openapi = openapi
+
+
+if __name__ == "__main__":
+    from backend.main import app
+
+    write_openapi(app, Path(sys.argv[1] if len(sys.argv) > 1 else "backend/openapi.json"))
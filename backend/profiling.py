@@ -0,0 +1,195 @@
+"""
+Per-request SQL profiling, for finding out which statements a request emits.
+
+A profiled request logs every statement it executed with its time, warns
+about statement shapes executed repeatedly (usually an N+1 of lazy loads such
+as chat.messages or message.user), logs the query plan of statements slower
+than SLOW_QUERY_MS, and answers with a Server-Timing header.
+
+PROFILE_QUERIES is read on every request, so it can be changed without a
+restart where the environment can be (e.g. os.environ in a debugger):
+
+    off     nothing is profiled (default)
+    header  requests sent with `X-Profile-Queries: 1` are profiled
+    all     every request is profiled
+
+Profiles expose timings to the client and make the server log and EXPLAIN
+statements, so operators opt in; clients can't turn it on by themselves.
+"""
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import Engine, event
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile-queries"
+EXPLAINED_STATEMENTS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+# bound parameters are already placeholders; only the expanded IN lists differ
+_PLACEHOLDER = r"(?:\?|%\([^)]*\)s|%s|\$\d+|:\w+)"
+_IN_LIST = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def profile_mode() -> str:
+    return os.environ.get("PROFILE_QUERIES", "off").lower()
+
+
+def slow_query_seconds() -> float:
+    return float(os.environ.get("SLOW_QUERY_MS", 100)) / 1000
+
+
+def repeated_query_threshold() -> int:
+    return int(os.environ.get("PROFILE_REPEATED_QUERIES", 3))
+
+
+def statement_shape(statement: str) -> str:
+    """The statement with whitespace collapsed and IN lists of any length made alike"""
+    return _IN_LIST.sub("(?...)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class ProfiledQuery:
+    __slots__ = ("statement", "seconds", "plan")
+
+    def __init__(self, statement: str, seconds: float, plan: Optional[list] = None):
+        self.statement = statement
+        self.seconds = seconds
+        self.plan = plan
+
+
+class QueryProfile:
+    """The statements executed while serving one request."""
+
+    def __init__(self):
+        self.queries: list[ProfiledQuery] = []
+
+    @property
+    def seconds(self) -> float:
+        return sum(query.seconds for query in self.queries)
+
+    def repeated(self, threshold: int) -> dict[str, int]:
+        """The statement shapes executed at least `threshold` times, with their counts"""
+        shapes = Counter(statement_shape(query.statement) for query in self.queries)
+        return {shape: count for shape, count in shapes.most_common() if count >= threshold}
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.seconds * 1000:.1f};desc="{len(self.queries)} queries"'
+
+
+current_profile: ContextVar[Optional[QueryProfile]] = ContextVar("current_profile", default=None)
+
+
+def _explain(conn, statement: str, parameters) -> Optional[list]:
+    """The plan of a statement, read through a raw cursor so no events fire for it"""
+    if conn.dialect.name == "sqlite":
+        explain = "EXPLAIN QUERY PLAN "
+    elif conn.dialect.name == "postgresql":
+        explain = "EXPLAIN "
+    else:
+        return None
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(explain + statement, parameters)
+        return [" ".join(str(column) for column in row) for row in cursor.fetchall()]
+    except Exception as exception:
+        return [f"plan unavailable: {exception}"]
+    finally:
+        cursor.close()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and current_profile.get() is not None:
+        context._profile_started_at = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile.get()
+    started_at = getattr(context, "_profile_started_at", None)
+    if profile is None or started_at is None:
+        return
+    query = ProfiledQuery(statement, time.perf_counter() - started_at)
+    profile.queries.append(query)
+
+    if (
+        query.seconds >= slow_query_seconds()
+        and not executemany
+        and statement.lstrip().upper().startswith(EXPLAINED_STATEMENTS)
+    ):
+        query.plan = _explain(conn, statement, parameters)
+        logger.warning(
+            "slow query (%.1f ms): %s\n%s",
+            query.seconds * 1000,
+            statement_shape(statement),
+            "\n".join(query.plan or ()),
+        )
+
+
+def _wants_profile(scope) -> bool:
+    mode = profile_mode()
+    if mode == "all":
+        return True
+    if mode != "header":
+        return False
+    return any(
+        name == PROFILE_HEADER and value.strip() in (b"1", b"true", b"yes")
+        for name, value in scope["headers"]
+    )
+
+
+def log_profile(method: str, path: str, profile: QueryProfile):
+    logger.info(
+        "%s %s: %d queries in %.1f ms\n%s",
+        method,
+        path,
+        len(profile.queries),
+        profile.seconds * 1000,
+        "\n".join(
+            f"  {query.seconds * 1000:8.2f} ms  {statement_shape(query.statement)}"
+            for query in profile.queries
+        ),
+    )
+    for shape, count in profile.repeated(repeated_query_threshold()).items():
+        logger.warning("%s %s: possible N+1, %d x %s", method, path, count, shape)
+
+
+class QueryProfilerMiddleware:
+    """
+    Profiles the SQL of requests selected by PROFILE_QUERIES.
+
+    The Server-Timing header covers the statements executed before the
+    response started; the log line written afterwards covers all of them,
+    including those of streamed bodies.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = QueryProfile()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    (b"server-timing", profile.server_timing().encode()),
+                ]
+            await send(message)
+
+        token = current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_profile.reset(token)
+            log_profile(scope["method"], scope["path"], profile)
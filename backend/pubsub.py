@@ -0,0 +1,127 @@
+import asyncio
+import json
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+@dataclass(frozen=True)
+class ChatEvent:
+    """An event published to a chat, serialized once for every subscriber."""
+
+    type: str
+    data: str  # json document sent to subscribers as is
+    id: Optional[int] = None
+
+    @classmethod
+    def create(cls, event_type: str, payload: dict, event_id: int = None) -> "ChatEvent":
+        return cls(
+            type=event_type,
+            data=json.dumps({"type": event_type, **payload}),
+            id=event_id,
+        )
+
+
+class SubscriberOverflow(Exception):
+    """Raised when a subscriber falls too far behind the events of its chat."""
+
+
+class Subscription:
+    """A single consumer of the events published to one chat."""
+
+    def __init__(self, hub: "ChatHub", chat_id: int, maxsize: int):
+        self.hub = hub
+        self.chat_id = chat_id
+        self.loop = asyncio.get_running_loop()
+        self.overflowed = False
+        self._queue: asyncio.Queue[ChatEvent] = asyncio.Queue(maxsize)
+
+    def _deliver(self, event: ChatEvent):
+        # always runs on the subscriber's event loop
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self) -> ChatEvent:
+        """
+        Waits for the next event published to the chat
+
+        :raises SubscriberOverflow: if events were dropped because the queue was full
+        """
+        if self.overflowed:
+            raise SubscriberOverflow()
+        event = await self._queue.get()
+        if self.overflowed:
+            raise SubscriberOverflow()
+        return event
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ChatHub:
+    """
+    In-process fan-out of chat events to the subscribers of each chat.
+
+    Publishing is thread safe so that sync request handlers running in the
+    threadpool can publish; each event is handed to the event loop of every
+    subscriber without touching the database.
+    """
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscriptions: dict[int, set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, chat_id: int) -> Subscription:
+        """Subscribes the running event loop to the events of a chat."""
+        subscription = Subscription(self, chat_id, self.queue_size)
+        with self._lock:
+            self._subscriptions.setdefault(chat_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.chat_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.chat_id]
+
+    def subscriber_count(self, chat_id: int) -> int:
+        with self._lock:
+            return len(self._subscriptions.get(chat_id, ()))
+
+    def publish(self, chat_id: int, event_type: str, payload: dict, event_id: int = None):
+        """
+        Publishes an event to every subscriber of a chat
+
+        :param chat_id: the chat the event belongs to
+        :param event_type: the type of the event, e.g. "message"
+        :param payload: json serializable body of the event
+        :param event_id: optional id subscribers may resume from
+        """
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(chat_id, ()))
+        if not subscriptions:
+            return
+
+        event = ChatEvent.create(event_type, payload, event_id)
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._deliver, event)
+            except RuntimeError:
+                # the subscriber's event loop has already shut down
+                self.unsubscribe(subscription)
+
+
+hub = ChatHub()
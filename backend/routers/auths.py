@@ -1,25 +1,29 @@
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
-from typing import Annotated
+from typing import Annotated, Optional
 
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import (
     OAuth2PasswordBearer,
     OAuth2PasswordRequestForm,
 )
-from jose import ExpiredSignatureError, JWTError, jwt
-from passlib.context import CryptContext
 from pydantic import BaseModel, ValidationError
 from sqlmodel import Session, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from backend import database as db
 from backend.entities import User, UserInDB, UserResponse
+from backend.hashing import password_hasher
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 access_token_duration = 3600  # seconds
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 jwt_key = os.environ.get("JWT_KEY", default="insecure-jwt-key-for-dev")
 jwt_alg = "HS256"
+token_cache_size = int(os.environ.get("TOKEN_CACHE_SIZE", 10000))
+token_cache_ttl = int(os.environ.get("TOKEN_CACHE_TTL", 300))  # seconds
 
 auth_router = APIRouter(prefix="/auth", tags=["Authentication"])
 
@@ -85,12 +89,89 @@ class ExpiredToken(AuthException):
         )
 
 
-def get_current_user(
-    session: Session = Depends(db.get_session),
+class TokenCache:
+    """
+    Bounded LRU cache of verified access tokens to a snapshot of their user.
+
+    Entries expire after the cache ttl or at the token's `exp` claim,
+    whichever comes first, and are dropped explicitly when the user changes.
+    Every invalidation bumps the user's generation, so a snapshot loaded
+    before the change and cached after it is discarded rather than stored.
+    """
+
+    def __init__(self, maxsize: int, ttl: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[dict, float]] = OrderedDict()
+        self._tokens_by_user: dict[int, set[str]] = {}
+        self._generations: dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[UserInDB]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            user_data, expires_at = entry
+            if time.time() >= expires_at:
+                self._remove(token)
+                return None
+            self._entries.move_to_end(token)
+        # a fresh detached instance per request so handlers can't share state
+        return UserInDB(**user_data)
+
+    def generation(self, user_id: int) -> int:
+        """The user's generation, to capture before loading the user to put."""
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def put(self, token: str, user: UserInDB, exp: int, generation: Optional[int] = None):
+        expires_at = min(exp, time.time() + self.ttl)
+        with self._lock:
+            if generation is not None and self._generations.get(user.id, 0) != generation:
+                # the user changed while it was being loaded
+                return
+            self._remove(token)
+            self._entries[token] = (user.model_dump(), expires_at)
+            self._tokens_by_user.setdefault(user.id, set()).add(token)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._remove(token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def _remove(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        user_id = entry[0]["id"]
+        tokens = self._tokens_by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[user_id]
+
+
+token_cache = TokenCache(maxsize=token_cache_size, ttl=token_cache_ttl)
+
+
+async def get_current_user(
+    session: AsyncSession = Depends(db.get_async_session),
     token: str = Depends(oauth2_scheme),
 ) -> UserInDB:
     """FastAPI dependency to get current user from bearer token."""
-    user = _decode_access_token(session, token)
+    # cache hits need neither the database nor a trip through run_sync
+    user = token_cache.get(token)
+    if user is None:
+        user = await session.run_sync(_decode_access_token, token)
     return user
 
 
@@ -102,11 +183,6 @@ def register_new_user(
 ):
     """Register new user."""
 
-    hashed_password = pwd_context.hash(registration.password)
-    user = UserInDB(
-        **registration.model_dump(),
-        hashed_password=hashed_password,
-    )
     # if username already exists
     if db.get_user_by_username(session, registration.username):
         raise HTTPException(
@@ -131,7 +207,15 @@ def register_new_user(
             }
         )
 
+    # only pay for bcrypt once the registration is known to be valid
+    hashed_password = password_hasher.hash(registration.password)
+    user = UserInDB(
+        **registration.model_dump(),
+        hashed_password=hashed_password,
+    )
+
     session.add(user)
+    db.bump_entity_versions(session, "users")
     session.commit()
     session.refresh(user)
     return UserResponse(user = User(id=user.id, username = user.username, email = user.email, created_at = user.created_at))
@@ -156,7 +240,7 @@ def _get_authenticated_user(
         select(UserInDB).where(UserInDB.username == form.username)
     ).first()
 
-    if user is None or not pwd_context.verify(form.password, user.hashed_password):
+    if user is None or not password_hasher.verify(form.password, user.hashed_password):
         raise InvalidCredentials()
 
     return user
@@ -165,6 +249,7 @@ def _get_authenticated_user(
 def _build_access_token(user: UserInDB) -> AccessToken:
     expiration = int(datetime.now(timezone.utc).timestamp()) + access_token_duration
     claims = Claims(sub=str(user.id), exp=expiration)
+    from jose import jwt  # imported on first use to keep it out of cold starts
     access_token = jwt.encode(claims.model_dump(), key=jwt_key, algorithm=jwt_alg)
 
     return AccessToken(
@@ -175,19 +260,32 @@ def _build_access_token(user: UserInDB) -> AccessToken:
 
 
 def _decode_access_token(session: Session, token: str) -> UserInDB:
+    """
+    Returns the user a bearer token belongs to.
+
+    Verified tokens are cached, so repeat calls skip the signature check and
+    the user lookup; cached users are detached from the session.
+    """
+    user = token_cache.get(token)
+    if user is not None:
+        return user
+
+    from jose import ExpiredSignatureError, JWTError, jwt  # see _build_access_token
     try:
         claims_dict = jwt.decode(token, key=jwt_key, algorithms=[jwt_alg])
         claims = Claims(**claims_dict)
-        user_id = claims.sub
+        user_id = int(claims.sub)
+        generation = token_cache.generation(user_id)
         user = session.get(UserInDB, user_id)
 
         if user is None:
             raise InvalidToken()
 
+        token_cache.put(token, user, claims.exp, generation)
         return user
     except ExpiredSignatureError:
         raise ExpiredToken()
     except JWTError:
         raise InvalidToken()
-    except ValidationError():
+    except (ValidationError, ValueError):
         raise InvalidToken()
@@ -0,0 +1,55 @@
+import hashlib
+
+from fastapi import Depends, Request, Response
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend import database as db
+
+
+class NotModified(Exception):
+    """Raised when the client's cached copy of a response is still current."""
+
+    def __init__(self, etag: str):
+        self.etag = etag
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+def versioned(*keys: str):
+    """
+    Makes a read endpoint answer conditional requests from version stamps
+
+    The ETag is derived from the request URL and the stamps of the given
+    entity keys, which may reference path parameters, e.g. "chat:{chat_id}",
+    or be derived from the data, e.g. "chats:activity". A request whose If-None-Match still matches is answered with 304 before
+    the endpoint runs.
+    """
+    async def check_version(
+        request: Request,
+        response: Response,
+        session: AsyncSession = Depends(db.get_async_session),
+    ):
+        names = [key.format(**request.path_params) for key in keys]
+        stamps = await session.run_sync(db.get_entity_versions, names)
+
+        digest = hashlib.sha256(f"{request.url.path}?{request.url.query}".encode())
+        for name in names:
+            digest.update(f"\0{name}={stamps.get(name, '')}".encode())
+        etag = f'"{digest.hexdigest()[:32]}"'
+
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match is not None and _matches(if_none_match, etag):
+            raise NotModified(etag)
+
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+
+    return Depends(check_version)
@@ -1,37 +1,97 @@
-from fastapi import APIRouter, Depends, Query
-from fastapi.responses import JSONResponse
-from sqlmodel import Session
+import asyncio
+import zlib
+
+import orjson
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlmodel.ext.asyncio.session import AsyncSession
+from backend import coalescer
 from backend import database as db
 from backend.routers.auths import get_current_user
+from backend.responses import payload_response
+from backend.routers.caching import versioned
 
 chats_router = APIRouter(prefix="/chats", tags=["Chats"])
 
 from backend.entities import *
 
 
-@chats_router.get("")
-def get_chats(session: Session = Depends(db.get_session)):
+@chats_router.get(
+    "",
+    response_model=ChatPage,
+    dependencies=[versioned("chats", "chats:activity", "users")],
+)
+async def get_chats(
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    cursor: Optional[int] = None,
+    limit: int = Query(db.CHAT_PAGE_SIZE, ge=1, le=db.MAX_CHAT_PAGE_SIZE),
+    include: list[str] = Query([]),
+    session: AsyncSession = Depends(db.get_async_session),
+):
     """
-    Get All Chats
+    Get a Page of Chats, most recently active first
+
+    Pass the page's `next_cursor` as `cursor` for the next one. The number of
+    matching chats is only counted with `include=total`.
     """
-    return db.get_chats(session)
+    return await session.run_sync(
+        db.get_chats, created_after, created_before, cursor, limit, "total" in include
+    )
 
 @chats_router.post("/{chat_id}/messages", status_code = 201)
-def new_message_handler(
+async def new_message_handler(
     chat_id: int,
     message: NewMessage,
-    session: Session = Depends(db.get_session),
+    session: AsyncSession = Depends(db.get_async_session),
     current_user: UserInDB = Depends(get_current_user)
 ) -> MessageResponse:
-    return db.new_message(session, chat_id, message.text, current_user.id)
+    if coalescer.message_coalescer is not None:
+        future = coalescer.message_coalescer.submit(chat_id, message.text, current_user.id)
+        return await asyncio.wrap_future(future)
+    return await session.run_sync(db.new_message, chat_id, message.text, current_user.id)
+
+@chats_router.post("/{chat_id}/messages:batch", status_code=201)
+async def new_messages_handler(
+    chat_id: int,
+    messages: list[NewMessage] = Body(min_length=1, max_length=db.MAX_MESSAGE_BATCH_SIZE),
+    session: AsyncSession = Depends(db.get_async_session),
+    current_user: UserInDB = Depends(get_current_user)
+) -> MessageBatchResponse:
+    """
+    Post many Messages to a Chat by Chat ID
+
+    All messages are added in one transaction and their ids returned in order.
+    """
+    texts = [message.text for message in messages]
+    return await session.run_sync(db.new_messages, chat_id, texts, current_user.id)
 
-@chats_router.get("/{chat_id}")
-def get_chat_by_id(
+@chats_router.post("/{chat_id}/read", response_model=ChatUnread)
+async def mark_chat_read(
+    chat_id: int,
+    marker: Optional[ReadMarkerUpdate] = None,
+    session: AsyncSession = Depends(db.get_async_session),
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Mark a Chat read by the current user by Chat ID
+
+    Up to the given message, or the latest one without a body. The read
+    marker never moves backwards, and posting doesn't move it; the member's
+    own messages are never counted as unread.
+    """
+    message_id = marker.message_id if marker else None
+    return await session.run_sync(db.mark_chat_read, chat_id, current_user.id, message_id)
+
+@chats_router.get("/{chat_id}", dependencies=[versioned("chat:{chat_id}", "users")])
+async def get_chat_by_id(
     chat_id: int,
     include: list[str] = Query([]),
-    session: Session = Depends(db.get_session)
+    session: AsyncSession = Depends(db.get_async_session)
 ):
-    data = db.get_chat_by_id(session, chat_id, "messages" in include, "users" in include)
+    data = await session.run_sync(
+        db.get_chat_by_id, chat_id, "messages" in include, "users" in include
+    )
 
     response_data = {
         "meta": data.meta,
@@ -47,23 +107,118 @@ def get_chat_by_id(
     return response_data
 
 @chats_router.put("/{chat_id}", response_model=ChatResponse)
-def update_chat_name(chat_id:int, new_name:ChatNameUpdate, session: Session = Depends(db.get_session)):
+async def update_chat_name(chat_id:int, new_name:ChatNameUpdate, session: AsyncSession = Depends(db.get_async_session)):
     """
     Update Chat Name by ID
     """
-    return db.update_chat_name(session, chat_id, new_name.name)
+    return await session.run_sync(db.update_chat_name, chat_id, new_name.name)
 
 
 @chats_router.get("/{chat_id}/messages", response_model=MessageCollection)
-def get_message_col_by_chat_id(chat_id:int, session: Session = Depends(db.get_session)):
+async def get_message_col_by_chat_id(
+    chat_id: int,
+    response: Response,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+    limit: int = Query(db.MESSAGE_PAGE_SIZE, ge=1, le=db.MAX_MESSAGE_PAGE_SIZE),
+    session: AsyncSession = Depends(db.get_async_session),
+):
     """
-    Get Message Collection by Chat ID
+    Get a page of the Message Collection by Chat ID
+
+    Returns the latest page unless a `before` or `after` message id cursor is given.
+    """
+    if before is not None and after is not None:
+        raise HTTPException(
+            status_code=422,
+            detail={
+                "type": "invalid_cursor",
+                "description": "only one of before and after may be given",
+            },
+        )
+    payload = await session.run_sync(
+        db.get_message_col_payload, chat_id, before, after, limit
+    )
+    return payload_response(payload, response)
+
+async def _export_lines(bind, chat_id: int, compress: bool):
+    # the request's session is closed before the body is streamed
+    async with AsyncSession(bind) as session:
+        gzip = zlib.compressobj(wbits=31) if compress else None
+        async for messages in db.stream_chat_messages(session, chat_id):
+            chunk = b"".join(orjson.dumps(message) + b"\n" for message in messages)
+            yield gzip.compress(chunk) if gzip else chunk
+        if gzip:
+            yield gzip.flush()
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header gives gzip, or failing that *, a q-value above 0"""
+    qualities = {}
+    for entry in accept_encoding.lower().split(","):
+        coding, *params = (part.strip() for part in entry.split(";"))
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding] = quality
+    for coding in ("gzip", "x-gzip", "*"):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+@chats_router.get("/{chat_id}/export", response_class=StreamingResponse)
+async def export_chat_messages(
+    chat_id: int,
+    accept_encoding: str = Header(""),
+    session: AsyncSession = Depends(db.get_async_session),
+):
+    """
+    Export every Message of a Chat by Chat ID
+
+    Streams the history oldest first as newline-delimited JSON, one message
+    per line, gzip encoded when the client accepts it.
     """
-    return db.get_message_col_by_chat_id(session, chat_id)
+    await session.run_sync(db.get_chat_in_db, chat_id)
+
+    compress = _accepts_gzip(accept_encoding)
+    headers = {"Content-Disposition": f'attachment; filename="chat-{chat_id}.ndjson"'}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    return StreamingResponse(
+        _export_lines(session.bind, chat_id, compress),
+        media_type="application/x-ndjson",
+        headers=headers,
+    )
+
+@chats_router.get("/{chat_id}/messages/search", response_model=MessageSearchCollection)
+async def search_chat_messages(
+    chat_id: int,
+    q: str = Query(min_length=1),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(db.SEARCH_PAGE_SIZE, ge=1, le=db.MAX_SEARCH_PAGE_SIZE),
+    session: AsyncSession = Depends(db.get_async_session),
+):
+    """
+    Search the Messages of a Chat by Chat ID
+
+    Returns messages containing every term in `q`, best match first.
+    """
+    return await session.run_sync(db.search_messages, q, chat_id, offset, limit)
 
 @chats_router.get("/{chat_id}/users", response_model=UserCollection)
-def get_users_in_chat_by_chat_id(chat_id:int, session: Session = Depends(db.get_session)):
+async def get_users_in_chat_by_chat_id(
+    chat_id: int,
+    response: Response,
+    session: AsyncSession = Depends(db.get_async_session),
+):
     """
     Get Users in Chat by Chat ID
     """
-    return db.get_users_in_chat_by_chat_id(session, chat_id,)
\ No newline at end of file
+    payload = await session.run_sync(db.get_users_in_chat_payload, chat_id)
+    return payload_response(payload, response)
\ No newline at end of file
@@ -0,0 +1,187 @@
+import asyncio
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, WebSocket, status
+from fastapi.responses import StreamingResponse
+from fastapi.security.utils import get_authorization_scheme_param
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend import database as db
+from backend.entities import MessageResponse
+from backend.pubsub import ChatEvent, SubscriberOverflow, Subscription, hub
+from backend.routers.auths import AuthException, get_current_user
+
+events_router = APIRouter(prefix="/chats", tags=["Chats"])
+
+sse_retry_ms = 2000
+sse_heartbeat_seconds = float(os.environ.get("SSE_HEARTBEAT_SECONDS", 15))
+# Mangum on Lambda sends nothing until the response ends, and API Gateway gives
+# up on it after 29s. There, a stream ends as soon as it has sent any events,
+# and the client reconnects with Last-Event-ID: long polling.
+sse_buffered = os.environ.get(
+    "SSE_BUFFERED", "1" if "AWS_LAMBDA_FUNCTION_NAME" in os.environ else "0"
+).lower() in ("1", "true", "yes")
+# streams are closed after this long and resumed by the client with Last-Event-ID
+sse_max_stream_seconds = float(
+    os.environ.get("SSE_MAX_STREAM_SECONDS", 20 if sse_buffered else 300)
+)
+
+
+async def _forward_events(websocket: WebSocket, subscription: Subscription):
+    while True:
+        event = await subscription.get()
+        await websocket.send_text(event.data)
+        if event.type == "chat_deleted":
+            return
+
+
+async def _wait_for_disconnect(websocket: WebSocket):
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+@events_router.websocket("/{chat_id}/ws")
+async def chat_websocket(
+    websocket: WebSocket,
+    chat_id: int,
+    token: Optional[str] = None,
+    session: AsyncSession = Depends(db.get_async_session),
+):
+    """
+    Stream the events of a chat over a WebSocket
+
+    The access token is read from the Authorization header or, for browser
+    clients that cannot set headers on a WebSocket, the `token` query parameter.
+    """
+    if token is None:
+        scheme, token = get_authorization_scheme_param(websocket.headers.get("Authorization"))
+        if scheme.lower() != "bearer":
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+
+    try:
+        await get_current_user(session=session, token=token)
+        await session.run_sync(db.get_chat_in_db, chat_id)
+    except (AuthException, db.EntityNotFoundException):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    finally:
+        # don't hold a pooled connection for the lifetime of the socket
+        await session.close()
+
+    await websocket.accept()
+    with hub.subscribe(chat_id) as subscription:
+        forward = asyncio.create_task(_forward_events(websocket, subscription))
+        disconnect = asyncio.create_task(_wait_for_disconnect(websocket))
+        done, pending = await asyncio.wait(
+            {forward, disconnect},
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        for task in pending:
+            task.cancel()
+
+        if forward in done:
+            try:
+                forward.result()
+            except SubscriberOverflow:
+                # the client fell behind; it should reconnect and re-read the history
+                await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+            else:
+                await websocket.close()
+
+
+def _format_sse(event: ChatEvent) -> str:
+    lines = [f"event: {event.type}"]
+    if event.id is not None:
+        lines.append(f"id: {event.id}")
+    lines.append(f"data: {event.data}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def _stream_events(
+    subscription: Subscription,
+    backlog: list[ChatEvent],
+    backlog_complete: bool,
+):
+    try:
+        yield f"retry: {sse_retry_ms}\n\n"
+
+        last_id = None
+        for event in backlog:
+            yield _format_sse(event)
+            last_id = event.id
+        if not backlog_complete or (backlog and sse_buffered):
+            # the client reconnects from the last id to fetch the rest
+            return
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + sse_max_stream_seconds
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                event = await asyncio.wait_for(
+                    subscription.get(),
+                    # keep-alives would only be delivered with the response's end
+                    remaining if sse_buffered else min(sse_heartbeat_seconds, remaining),
+                )
+            except asyncio.TimeoutError:
+                if not sse_buffered:
+                    yield ": keep-alive\n\n"
+                continue
+
+            # the subscription was opened before the backlog was read
+            if last_id is not None and event.id is not None and event.id <= last_id:
+                continue
+            yield _format_sse(event)
+            if event.type == "chat_deleted" or sse_buffered:
+                return
+    except SubscriberOverflow:
+        return
+    finally:
+        subscription.close()
+
+
+@events_router.get("/{chat_id}/events", response_class=StreamingResponse)
+async def chat_event_stream(
+    chat_id: int,
+    last_event_id: Optional[int] = Header(None),
+    session: AsyncSession = Depends(db.get_async_session),
+):
+    """
+    Stream the events of a chat as Server-Sent Events
+
+    Emits `message`, `chat_renamed` and `chat_deleted` events. Message events
+    carry the message id, so a client reconnecting with a `Last-Event-ID`
+    header first receives the messages it missed.
+    """
+    await session.run_sync(db.get_chat_in_db, chat_id)
+
+    subscription = hub.subscribe(chat_id)
+    try:
+        backlog = []
+        backlog_complete = True
+        if last_event_id is not None:
+            missed = await session.run_sync(
+                db.get_message_col_by_chat_id,
+                chat_id,
+                after=last_event_id,
+                limit=db.MAX_MESSAGE_PAGE_SIZE,
+            )
+            backlog = [
+                ChatEvent.create(
+                    "message",
+                    MessageResponse(message=message).model_dump(mode="json"),
+                    message.id,
+                )
+                for message in missed.messages
+            ]
+            backlog_complete = missed.meta.next_cursor is None
+    except BaseException:
+        subscription.close()
+        raise
+
+    return StreamingResponse(
+        _stream_events(subscription, backlog, backlog_complete),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Depends, Query
+from sqlmodel.ext.asyncio.session import AsyncSession
+from backend import database as db
+from backend.entities import MessageSearchCollection
+
+messages_router = APIRouter(prefix="/messages", tags=["Messages"])
+
+
+@messages_router.get("/search", response_model=MessageSearchCollection)
+async def search_messages(
+    q: str = Query(min_length=1),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(db.SEARCH_PAGE_SIZE, ge=1, le=db.MAX_SEARCH_PAGE_SIZE),
+    session: AsyncSession = Depends(db.get_async_session),
+):
+    """
+    Search the Messages of every Chat
+
+    Returns messages containing every term in `q`, best match first.
+    """
+    return await session.run_sync(db.search_messages, q, None, offset, limit)
@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends
-from sqlmodel import Session
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query, Response
+from sqlmodel.ext.asyncio.session import AsyncSession
 from backend import database as db
 
 users_router = APIRouter(prefix="/users", tags=["Users"])
 
-from backend.routers.auths import get_current_user
+from backend.routers.auths import get_current_user, token_cache
+from backend.responses import payload_response
+from backend.routers.caching import versioned
 from backend.schema import *
 
 from backend.entities import *
@@ -12,48 +17,72 @@ from backend.entities import *
 
 
 
-@users_router.get("")
-def get_users(session: Session = Depends(db.get_session)):
+@users_router.get("", response_model=UserPage, dependencies=[versioned("users")])
+async def get_users(
+    response: Response,
+    username_prefix: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    cursor: Optional[int] = None,
+    limit: int = Query(db.USER_PAGE_SIZE, ge=1, le=db.MAX_USER_PAGE_SIZE),
+    include: list[str] = Query([]),
+    session: AsyncSession = Depends(db.get_async_session),
+):
     """
-    Gets all users in the database
+    Gets a page of users in sign-up order, or by username with a prefix
+
+    Pass the page's `next_cursor` as `cursor` for the next one. The number of
+    matching users is only counted with `include=total`.
     """
-    return db.get_all_users(session)
+    payload = await session.run_sync(
+        db.get_all_users_payload,
+        username_prefix,
+        created_after,
+        created_before,
+        cursor,
+        limit,
+        "total" in include,
+    )
+    return payload_response(payload, response)
 
 @users_router.get("/me", response_model=UserResponse)
-def get_self(user: UserInDB = Depends(get_current_user)):
+async def get_self(user: UserInDB = Depends(get_current_user)):
     """Get current user."""
     return UserResponse(user=User(**user.model_dump()))
 
 @users_router.put("/me", response_model=UserResponse)
-def update_current_user_data(
+async def update_current_user_data(
     update_data: UpdateUserData,
     current_user: UserInDB = Depends(get_current_user),
-    session: Session = Depends(db.get_session),
+    session: AsyncSession = Depends(db.get_async_session),
 ):
     """Update the username or email of the current user."""
-    if update_data.username:
-        current_user.username = update_data.username
-    if update_data.email:
-        current_user.email = update_data.email
-    
-    session.commit()
-    session.refresh(current_user)
-    
-    return UserResponse(user = User(
-        id = current_user.id,
-        username = current_user.username,
-        email = current_user.email,
-        created_at = current_user.created_at
-    ))
+    response = await session.run_sync(
+        db.update_user, current_user.id, update_data.username, update_data.email
+    )
+    token_cache.invalidate_user(current_user.id)
+    return response
+
+@users_router.get("/me/chats", response_model=UnreadChatCollection)
+async def get_own_chats(
+    user: UserInDB = Depends(get_current_user),
+    session: AsyncSession = Depends(db.get_async_session),
+):
+    """Get the current user's chats with the number of unread messages in each."""
+    return await session.run_sync(db.get_user_chats_with_unread, user.id)
 
 @users_router.get("/{user_id}", response_model=UserResponse)
-def get_user(user_id: int, session: Session = Depends(db.get_session)):
+async def get_user(user_id: int, session: AsyncSession = Depends(db.get_async_session)):
     """Get new user data from the database"""
-    return db.get_user(session, user_id)
+    return await session.run_sync(db.get_user, user_id)
 
-@users_router.get("/{user_id}/chats", response_model=ChatCollection)
-def get_user_chats(user_id: int, session: Session = Depends(db.get_session)):
+@users_router.get(
+    "/{user_id}/chats",
+    response_model=ChatCollection,
+    dependencies=[versioned("chats", "chats:activity", "users")],
+)
+async def get_user_chats(user_id: int, session: AsyncSession = Depends(db.get_async_session)):
     """Get a list of all chats a given user has participated in"""
-    return db.get_user_chats(session, user_id)
+    return await session.run_sync(db.get_user_chats, user_id)
 
 
@@ -1,13 +1,43 @@
 from datetime import datetime
 from typing import Optional
 
+from sqlalchemy import DateTime, ForeignKeyConstraint, Index
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
 from sqlmodel import Field, Relationship, SQLModel
 
 
+def _created_at_default(context) -> datetime:
+    """Defaults a column to the row's created_at, for inserts that leave it out."""
+    return context.get_current_parameters().get("created_at") or datetime.now()
+
+
+class local_timestamp(FunctionElement):
+    """The current local time without a time zone, as datetime.now() stores it."""
+
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(local_timestamp)
+def _compile_local_timestamp(element, compiler, **kw):
+    return "LOCALTIMESTAMP"
+
+
+@compiles(local_timestamp, "sqlite")
+def _compile_local_timestamp_sqlite(element, compiler, **kw):
+    # CURRENT_TIMESTAMP is UTC on SQLite
+    return "datetime('now', 'localtime')"
+
+
 class UserChatLinkInDB(SQLModel, table=True):
     """Database model for many-to-many relation of users to chats."""
 
     __tablename__ = "user_chat_links"
+    __table_args__ = (
+        # the primary key only covers lookups by user
+        Index("ix_user_chat_links_chat_id", "chat_id"),
+    )
 
     user_id: int = Field(foreign_key="users.id", primary_key=True)
     chat_id: int = Field(foreign_key="chats.id", primary_key=True)
@@ -17,6 +47,10 @@ class UserInDB(SQLModel, table=True):
     """Database model for user."""
 
     __tablename__ = "users"
+    __table_args__ = (
+        # the user directory is listed in sign-up order
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     username: str = Field(unique=True, index=True)
@@ -34,11 +68,28 @@ class ChatInDB(SQLModel, table=True):
     """Database model for chat."""
 
     __tablename__ = "chats"
+    __table_args__ = (
+        # chat lists are ordered by latest activity
+        Index("ix_chats_last_activity_at_id", "last_activity_at", "id"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str
     owner_id: int = Field(foreign_key="users.id")
     created_at: Optional[datetime] = Field(default_factory=datetime.now)
+    # maintained by every write of messages; no foreign key, as messages
+    # already reference chats and the cycle would complicate creating and
+    # dropping the tables
+    last_message_id: Optional[int] = None
+    # a chat without messages is as recent as its creation, so chat lists
+    # can always seek on (last_activity_at, id)
+    last_activity_at: Optional[datetime] = Field(
+        default=None,
+        sa_column_kwargs={
+            "default": _created_at_default,
+            "server_default": local_timestamp(),
+        },
+    )
 
     owner: UserInDB = Relationship()
     users: list[UserInDB] = Relationship(
@@ -46,12 +97,30 @@ class ChatInDB(SQLModel, table=True):
         link_model=UserChatLinkInDB,
     )
     messages: list["MessageInDB"] = Relationship(back_populates="chat")
+    stats: Optional["ChatStatsInDB"] = Relationship(
+        sa_relationship_kwargs={"uselist": False, "viewonly": True},
+    )
+    last_message: Optional["MessageInDB"] = Relationship(
+        sa_relationship_kwargs={
+            "primaryjoin": "foreign(ChatInDB.last_message_id) == MessageInDB.id",
+            "uselist": False,
+            "viewonly": True,
+        },
+    )
 
 
 class MessageInDB(SQLModel, table=True):
     """Database model for message."""
 
     __tablename__ = "messages"
+    __table_args__ = (
+        # keyset pagination walks a chat's history in (created_at, id) order
+        Index("ix_messages_chat_id_created_at_id", "chat_id", "created_at", "id"),
+        # unread counts are range counts of a chat's messages after a read marker
+        Index("ix_messages_chat_id_id", "chat_id", "id"),
+        # and a user's own messages among them are left out
+        Index("ix_messages_user_id_chat_id_id", "user_id", "chat_id", "id"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     text: str
@@ -62,3 +131,46 @@ class MessageInDB(SQLModel, table=True):
     user: UserInDB = Relationship()
     chat: ChatInDB = Relationship(back_populates="messages")
 
+
+class ChatStatsInDB(SQLModel, table=True):
+    """Database model for the maintained counters of a chat."""
+
+    __tablename__ = "chat_stats"
+
+    chat_id: int = Field(foreign_key="chats.id", primary_key=True)
+    message_count: int = 0
+    user_count: int = 0
+
+
+class ReadMarkerInDB(SQLModel, table=True):
+    """Database model for the last message a member of a chat has read."""
+
+    __tablename__ = "read_markers"
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["user_id", "chat_id"],
+            ["user_chat_links.user_id", "user_chat_links.chat_id"],
+        ),
+    )
+
+    user_id: int = Field(primary_key=True)
+    chat_id: int = Field(primary_key=True)
+    last_read_message_id: int
+    updated_at: Optional[datetime] = Field(default_factory=datetime.now)
+
+
+class EntityVersionInDB(SQLModel, table=True):
+    """Database model for the version stamp of a cacheable set of entities."""
+
+    __tablename__ = "entity_versions"
+
+    key: str = Field(primary_key=True)  # e.g. "users", "chats" or "chat:1"
+    stamp: str
+
+
+class SchemaVersionInDB(SQLModel, table=True):
+    """Database model for the fingerprint of the schema the database was last set up with."""
+
+    __tablename__ = "schema_version"
+
+    fingerprint: str = Field(primary_key=True)
@@ -0,0 +1,108 @@
+"""
+Cold start of the Lambda handler: every run is a fresh interpreter that
+imports backend.main and serves two requests through the Mangum handler, the
+way a new Lambda instance would. The first run against an empty database also
+creates the schema; later runs find it current.
+
+    python -m benchmarks.cold_start --runs 5 --path /chats
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+PROBE = """
+import json, sys, time
+started_at = time.perf_counter()
+from backend.main import lambda_handler
+imported_at = time.perf_counter()
+
+def event(path):
+    return {
+        "version": "2.0",
+        "routeKey": "$default",
+        "rawPath": path,
+        "rawQueryString": "",
+        "headers": {"host": "localhost"},
+        "requestContext": {
+            "http": {"method": "GET", "path": path, "protocol": "HTTP/1.1", "sourceIp": "127.0.0.1"},
+            "stage": "$default",
+        },
+        "isBase64Encoded": False,
+    }
+
+timings = {"import_seconds": imported_at - started_at}
+for name in ("first_request_seconds", "second_request_seconds"):
+    request_started_at = time.perf_counter()
+    response = lambda_handler(event(sys.argv[1]), None)
+    timings[name] = time.perf_counter() - request_started_at
+    assert response["statusCode"] == 200, response
+print(json.dumps(timings))
+"""
+
+IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)")
+
+
+def _probe(path: str, env: dict) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, path],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _slowest_imports(env: dict, count: int) -> list[dict]:
+    """The modules whose own import takes longest, from python -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import backend.main"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imports = [
+        (module, int(self_micros))
+        for self_micros, _, module in IMPORT_TIME.findall(result.stderr)
+    ]
+    slowest = sorted(imports, key=lambda item: item[1], reverse=True)[:count]
+    return [{"module": module, "seconds": micros / 1e6} for module, micros in slowest]
+
+
+def _summary(runs: list[dict]) -> dict:
+    return {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/chats")
+    parser.add_argument("--top-imports", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{Path(directory) / 'cold_start.db'}",
+            "PYTHONPATH": str(Path(__file__).resolve().parents[1]),
+        }
+        first = _probe(args.path, env)
+        runs = [_probe(args.path, env) for _ in range(args.runs)]
+        slowest = _slowest_imports(env, args.top_imports)
+
+    print(json.dumps({
+        "empty_database": first,
+        "current_schema": _summary(runs),
+        "slowest_imports": slowest,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
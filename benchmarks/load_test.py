@@ -0,0 +1,236 @@
+"""
+Throughput and latency of the main api paths under concurrent load.
+
+The real app is driven in process through httpx's ASGI transport, against a
+database generated by backend.db_generator with `--users` users, `--chats`
+chats and `--messages` messages. Every scenario runs for `--seconds` with `--concurrency` clients
+and reports requests per second and p50/p99 latency:
+
+    python -m benchmarks.load_test --output before.json
+    python -m benchmarks.load_test --output after.json --baseline before.json
+
+With --baseline, scenarios whose throughput dropped or whose p99 grew by more
+than --tolerance are listed as regressions and the exit status is 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+
+class Scenarios:
+    """The requests the load test makes, each picking its own chat or user."""
+
+    def __init__(self, users: int, chats: int, password: str, tokens: dict[int, str], rng: random.Random):
+        self.users = users
+        self.chats = chats
+        self.password = password
+        self.tokens = tokens
+        self.rng = rng
+
+    def _auth(self) -> dict:
+        token = self.tokens[self.rng.choice(list(self.tokens))]
+        return {"Authorization": f"Bearer {token}"}
+
+    def post_message(self, client: httpx.AsyncClient):
+        return client.post(
+            f"/chats/{self.rng.randint(1, self.chats)}/messages",
+            json={"text": "load test message"},
+            headers=self._auth(),
+        )
+
+    def read_chat(self, client: httpx.AsyncClient):
+        return client.get(f"/chats/{self.rng.randint(1, self.chats)}")
+
+    def list_messages(self, client: httpx.AsyncClient):
+        return client.get(f"/chats/{self.rng.randint(1, self.chats)}/messages")
+
+    def login(self, client: httpx.AsyncClient):
+        return client.post("/auth/token", data={
+            "username": f"user{self.rng.randint(1, self.users)}",
+            "password": self.password,
+        })
+
+    def users_me(self, client: httpx.AsyncClient):
+        return client.get("/users/me", headers=self._auth())
+
+
+SCENARIOS = ["post_message", "read_chat", "list_messages", "login", "users_me"]
+
+
+def _percentile(latencies: list[float], percentile: int) -> float:
+    if len(latencies) < 2:
+        return latencies[0] if latencies else 0.0
+    return statistics.quantiles(latencies, n=100, method="inclusive")[percentile - 1]
+
+
+async def _run_scenario(client: httpx.AsyncClient, request, seconds: float, concurrency: int) -> dict:
+    latencies = []
+    statuses = Counter()
+    deadline = time.perf_counter() + seconds
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            started_at = time.perf_counter()
+            response = await request(client)
+            latencies.append(time.perf_counter() - started_at)
+            statuses[response.status_code] += 1
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started_at
+
+    return {
+        "requests": len(latencies),
+        "errors": sum(count for status, count in statuses.items() if status >= 400),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "requests_per_second": len(latencies) / elapsed,
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+async def _load_test(app, args, password: str, rng: random.Random) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load-test") as client:
+        tokens = {}
+        for user_id in rng.sample(range(1, args.users + 1), min(args.logged_in_users, args.users)):
+            response = await client.post("/auth/token", data={
+                "username": f"user{user_id}",
+                "password": password,
+            })
+            response.raise_for_status()
+            tokens[user_id] = response.json()["access_token"]
+
+        scenarios = Scenarios(args.users, args.chats, password, tokens, rng)
+        results = {}
+        for name in args.scenarios:
+            request = getattr(scenarios, name)
+            # warm up caches and connection pools before measuring
+            await _run_scenario(client, request, min(args.seconds, 0.5), args.concurrency)
+            results[name] = await _run_scenario(client, request, args.seconds, args.concurrency)
+            print(f"{name}: {results[name]['requests_per_second']:.0f} req/s", file=sys.stderr)
+        return results
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parents[1],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, results: dict, tolerance: float) -> dict:
+    """
+    Compares the scenarios present in both runs
+
+    :param tolerance: the fraction throughput may drop or p99 latency grow by
+    :return: the relative change of every metric and the regressed scenarios
+    """
+    changes = {}
+    regressions = []
+    for name, result in results["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        changes[name] = {
+            metric: (result[metric] - before[metric]) / before[metric] if before[metric] else None
+            for metric in ("requests_per_second", "p50_ms", "p99_ms")
+        }
+        throughput = changes[name]["requests_per_second"]
+        p99 = changes[name]["p99_ms"]
+        if (throughput is not None and throughput < -tolerance) or (p99 is not None and p99 > tolerance):
+            regressions.append(name)
+    return {
+        "baseline_commit": baseline.get("commit"),
+        "changes": changes,
+        "regressions": regressions,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--chats", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--logged-in-users", type=int, default=20)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database-url", help="a database generated earlier by backend.db_generator, to run against")
+    parser.add_argument("--output", help="json file to save the results to")
+    parser.add_argument("--baseline", help="results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        # backend.database reads its url on import
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{Path(directory) / 'load_test.db'}"
+        from backend import database as db
+        from backend.db_generator import DEFAULT_PASSWORD, generate_database
+        from backend.main import app
+
+        if not args.database_url:
+            started_at = time.perf_counter()
+            generate_database(
+                db.engine,
+                users=args.users,
+                chats=args.chats,
+                messages=args.messages,
+                seed=args.seed,
+                progress=lambda *progress: None,
+            )
+            print(f"seeded in {time.perf_counter() - started_at:.1f}s", file=sys.stderr)
+        db.create_db_and_tables()
+
+        scenarios = asyncio.run(_load_test(app, args, DEFAULT_PASSWORD, rng))
+        db.engine.dispose()
+
+    results = {
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "parameters": {
+            key: getattr(args, key)
+            for key in ("users", "chats", "messages", "seconds", "concurrency", "seed")
+        },
+        "scenarios": scenarios,
+    }
+    if args.baseline:
+        results["comparison"] = compare(
+            json.loads(Path(args.baseline).read_text()),
+            results,
+            args.tolerance,
+        )
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    print(json.dumps(results, indent=2))
+
+    if args.baseline and results["comparison"]["regressions"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Per-message cost of serving a large page of messages the way the chats
+router used to (one Message model per row, re-validated and encoded by
+FastAPI) versus the row payload path encoded with orjson.
+
+    python -m benchmarks.serialization --messages 10000 --repeat 5
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy.orm import joinedload
+from sqlmodel import Session, select
+
+from backend import database as db
+from backend.entities import Message, MessageCollection, PaginatedMetadata, User
+from backend.schema import MessageInDB
+from benchmarks.sqlite_tuning import _seed
+
+
+def _models_page(session: Session, limit: int) -> MessageCollection:
+    """What get_message_col_by_chat_id used to build"""
+    messages = session.exec(
+        select(MessageInDB)
+        .where(MessageInDB.chat_id == 1)
+        .order_by(MessageInDB.created_at.desc(), MessageInDB.id.desc())
+        .options(joinedload(MessageInDB.user))
+        .limit(limit + 1)
+    ).all()[:limit]
+    return MessageCollection(
+        meta=PaginatedMetadata(count=len(messages)),
+        messages=[
+            Message(
+                id=message.id,
+                text=message.text,
+                chat_id=message.chat_id,
+                user=User(**message.user.model_dump()),
+                created_at=message.created_at,
+            )
+            for message in reversed(messages)
+        ],
+    )
+
+
+def _serve_models(session: Session, limit: int) -> bytes:
+    field = create_response_field(name="response", type_=MessageCollection)
+    content = asyncio.run(serialize_response(
+        field=field,
+        response_content=_models_page(session, limit),
+        is_coroutine=True,
+    ))
+    return JSONResponse(content).body
+
+
+def _serve_payload(session: Session, limit: int) -> bytes:
+    return ORJSONResponse(db.get_message_col_payload(session, 1, limit=limit)).body
+
+
+def _time(fn, engine, limit: int, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        with Session(engine) as session:
+            started_at = time.perf_counter()
+            body = fn(session, limit)
+            timings.append(time.perf_counter() - started_at)
+    best = min(timings)
+    return {
+        "best_seconds": best,
+        "microseconds_per_message": best / limit * 1e6,
+        "bytes": len(body),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = db.make_engine(f"sqlite:///{Path(directory) / 'bench.db'}", echo=False)
+        _seed(engine, args.messages)
+        results = {
+            "models": _time(_serve_models, engine, args.messages, args.repeat),
+            "payload": _time(_serve_payload, engine, args.messages, args.repeat),
+        }
+        engine.dispose()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
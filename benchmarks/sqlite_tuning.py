@@ -0,0 +1,103 @@
+"""
+Concurrent read/write throughput of the SQLite database with default
+settings versus the tuned engine from backend.database.make_engine.
+
+    python -m benchmarks.sqlite_tuning --seconds 10 --writers 4 --readers 8
+"""
+import argparse
+import json
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlmodel import Session, SQLModel, create_engine
+
+from backend import database as db
+from backend.schema import ChatInDB, MessageInDB, UserChatLinkInDB, UserInDB
+
+
+def _seed(engine, messages: int):
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(UserInDB(id=1, username="bench", email="bench@example.com", hashed_password="x"))
+        session.add(ChatInDB(id=1, name="bench", owner_id=1))
+        session.add(UserChatLinkInDB(user_id=1, chat_id=1))
+        session.add_all(
+            MessageInDB(text=f"seed {i}", user_id=1, chat_id=1) for i in range(messages)
+        )
+        session.commit()
+
+
+def _run(engine, seconds: float, writers: int, readers: int) -> dict:
+    stop = threading.Event()
+    counts = {"writes": 0, "reads": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def count(key):
+        with lock:
+            counts[key] += 1
+
+    def writer():
+        while not stop.is_set():
+            try:
+                with Session(engine) as session:
+                    session.add(MessageInDB(text="benchmark message", user_id=1, chat_id=1))
+                    session.commit()
+                count("writes")
+            except Exception:
+                count("errors")
+
+    def reader():
+        while not stop.is_set():
+            try:
+                with Session(engine) as session:
+                    db.get_message_col_by_chat_id(session, 1, limit=50)
+                count("reads")
+            except Exception:
+                count("errors")
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return {
+        "writes_per_second": counts["writes"] / seconds,
+        "reads_per_second": counts["reads"] / seconds,
+        "errors": counts["errors"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seed-messages", type=int, default=10_000)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        engines = {
+            # what backend.database used to create
+            "default": create_engine(
+                f"sqlite:///{Path(directory) / 'default.db'}",
+                connect_args={"check_same_thread": False},
+            ),
+            "tuned": db.make_engine(f"sqlite:///{Path(directory) / 'tuned.db'}", echo=False),
+        }
+        for name, engine in engines.items():
+            _seed(engine, args.seed_messages)
+            results[name] = _run(engine, args.seconds, args.writers, args.readers)
+            engine.dispose()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,9 @@
-import { useApi } from "../hooks"
+import { unreadChatsKey, useApi } from "../hooks"
 import { useQuery } from "react-query"
 import { NavLink } from "react-router-dom"
 
 
-function Link({ chat }) {
+function Link({ chat, unreadCount }) {
     const url = chat.empty ? "#" : `/chats/${chat.id}`;
     const className = ({ isActive }) => [
       "p-2",
@@ -21,6 +21,11 @@ function Link({ chat }) {
     return (
       <NavLink to={url} className={className}>
         {chatName}
+        {unreadCount > 0 && (
+          <span className="ml-2 px-2 rounded-full bg-purple-400 text-black text-sm font-bold">
+            {unreadCount}
+          </span>
+        )}
       </NavLink>
     );
   }
@@ -36,21 +41,25 @@ const emptyChat = (id) => ({
 function LeftNav() {
     const api = useApi();
   
+    // the current user's chats with their unread counts, in a single query
     const { data } = useQuery({
-      queryKey: ["chats"],
+      queryKey: unreadChatsKey,
       queryFn: () => (
-        api.get("/chats")
+        api.get("/users/me/chats")
           .then((response) => response.json())
       ),
     });
   
     const chats = ( data?.chats || [1, 2, 3].map(emptyChat));
+    const unreadCounts = Object.fromEntries(
+      (data?.unread || []).map(({ chat_id, unread_count }) => [chat_id, unread_count])
+    );
   
     return (
       <nav className="flex flex-col border-r-2 border-purple-400 h-main text-lg">
         <div className="flex flex-col border-b-2 border-purple-400">
           {chats.map((chat) => (
-            <Link key={chat.id} chat={chat} className="text-xl"/>
+            <Link key={chat.id} chat={chat} unreadCount={unreadCounts[chat.id]} className="text-xl"/>
           ))}
         </div>
       </nav>
@@ -1,11 +1,11 @@
 import Message from "./Message";
-import { useApi } from "../hooks";
+import { unreadChatsKey, useApi } from "../hooks";
 import { useQuery, useQueryClient } from "react-query";
 import { useParams } from "react-router-dom";
 import ScrollContainer from "./ScrollContainer";
 import Input from "./FormInput";
 import Button from "./Button"
-import { useState } from "react";
+import { useEffect, useState } from "react";
 import { useMutation } from "react-query";
 
 function MessageCard({ message }) {
@@ -23,8 +23,43 @@ function MessageCard({ message }) {
 }
 
 
+// messages arrive both from our own posts and over the chat's websocket
+const appendMessage = (queryClient, chatId, message) => (
+    queryClient.setQueryData(["messages", chatId], (old) => (
+      old && !old.messages.some(({ id }) => id === message.id) ?
+        { ...old, messages: [...old.messages, message] } :
+        old
+    ))
+);
+
+// the first page is the latest one; older pages are added in front of it
+const prependOlderMessages = (queryClient, chatId, page) => (
+    queryClient.setQueryData(["messages", chatId], (old) => ({
+      ...old,
+      meta: { ...old.meta, prev_cursor: page.meta.prev_cursor },
+      messages: [...page.messages, ...old.messages],
+    }))
+);
+
 function MessageCardQueryContainer({ chatId }) {
     const api = useApi();
+    const queryClient = useQueryClient();
+
+    // append messages pushed by the server instead of refetching the chat
+    useEffect(() => {
+      if (chatId === undefined) {
+        return;
+      }
+      const socket = api.socket(`/chats/${chatId}/ws`);
+      socket.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        if (data.type === "message") {
+          appendMessage(queryClient, chatId, data.message);
+        }
+      };
+      return () => socket.close();
+    }, [chatId]);
+
     const { data } = useQuery({
       queryKey: ["messages", chatId],
       queryFn: () => (
@@ -33,9 +68,34 @@ function MessageCardQueryContainer({ chatId }) {
       ),
       enabled: chatId !== undefined,
     });
+
+    // everything shown is read, including messages appended while the chat is open
+    const lastMessageId = data?.messages?.at(-1)?.id;
+    useEffect(() => {
+      if (lastMessageId === undefined) {
+        return;
+      }
+      api.post(`/chats/${chatId}/read`, { message_id: lastMessageId })
+        .then(() => queryClient.invalidateQueries(unreadChatsKey));
+    }, [chatId, lastMessageId]);
   
+    const loadOlder = () => (
+      api.get(`/chats/${chatId}/messages?before=${data.meta.prev_cursor}`)
+        .then((response) => response.json())
+        .then((page) => prependOlderMessages(queryClient, chatId, page))
+    );
+
     if (data?.messages) {
-      return data.messages.map((message) => <MessageCard key={message.id} message={message} />);
+      return (
+        <>
+          {data.meta?.prev_cursor && (
+            <div className="text-center py-2">
+              <Button type="button" onClick={loadOlder}>load older</Button>
+            </div>
+          )}
+          {data.messages.map((message) => <MessageCard key={message.id} message={message} />)}
+        </>
+      );
     }
   
     return null; // or some loading state
@@ -62,11 +122,11 @@ function Messages() {
             }
         )
     ),
-    onSuccess: () => {
-        queryClient.invalidateQueries({
-            queryKey: ["messages", chatId]
-        })
-    }
+    onSuccess: (response) => response.json().then((data) => {
+        if (data.message) {
+            appendMessage(queryClient, chatId, data.message);
+        }
+    })
   })
   if (chatId) {
     
@@ -12,11 +12,15 @@ const useApiWithoutToken = () => {
   return api();
 }
 
+// the query of the current user's chats and unread counts, refreshed after reads
+const unreadChatsKey = ["users", "me", "chats"];
+
 const useAuth = () => useContext(AuthContext);
 
 const useUser = () => useContext(UserContext);
 
 export {
+  unreadChatsKey,
   useApi,
   useApiWithoutToken,
   useAuth,
@@ -38,7 +38,13 @@ const api = (token) => {
       )
     );
   
-    return { get, post, postForm };
+    const socket = (url) => (
+      new WebSocket(
+        baseUrl.replace(/^http/, "ws") + url + (token ? "?token=" + token : ""),
+      )
+    );
+  
+    return { get, post, postForm, socket };
   };
   
   export default api;
@@ -1,11 +1,16 @@
 
 from fastapi.testclient import TestClient
-from datetime import datetime, timezone
+import json
+import time
+from datetime import datetime, timedelta, timezone
 import pytest
 
 from datetime import date
 from backend.main import app
-from backend.schema import ChatInDB, UserInDB
+from backend import database as db
+from backend.schema import ChatInDB, ChatStatsInDB, MessageInDB, UserChatLinkInDB, UserInDB
+from sqlalchemy import delete, event
+from sqlmodel import select
 
 client = TestClient(app)
 
@@ -47,7 +52,19 @@ def test_get_skynet_chat(client, default_data):
             "email": "danbis@gmail.com",
             "created_at": "2021-05-05T00:00:00"
         },
-        "created_at": "2021-05-07T00:00:00"
+        "created_at": "2021-05-07T00:00:00",
+        "last_activity_at": "2021-05-06T00:00:00",
+        "last_message": {
+            "id": 2,
+            "text": "Lame",
+            "user": {
+                "id": 2,
+                "username": "sarah",
+                "email": "dannith@gmail.com",
+                "created_at": "2021-05-05T00:00:00"
+            },
+            "created_at": "2021-05-06T00:00:00"
+        }
     },
     "users": [
         {
@@ -86,4 +103,596 @@ def test_post_new_message(client, default_data):
         headers={"Authorization": f"Bearer {token}"},
         json={"text": "new message"},
     )
-    assert response.status_code == 201
\ No newline at end of file
+    assert response.status_code == 201
+
+def _add_messages(session, count, chat_id=1, user_id=1):
+    messages = [
+        MessageInDB(
+            text=f"message {i}",
+            user_id=user_id,
+            chat_id=chat_id,
+            created_at=datetime(2022, 1, 1, 12, 0, i % 60, i),
+        )
+        for i in range(count)
+    ]
+    session.add_all(messages)
+    session.commit()
+    return [message.id for message in messages]
+
+
+def test_get_messages_latest_page(client, session, default_data):
+    """GET /chats/1/messages?limit=3"""
+    ids = _add_messages(session, 5)
+
+    response = client.get("/chats/1/messages?limit=3")
+    assert response.status_code == 200
+    body = response.json()
+
+    assert [m["id"] for m in body["messages"]] == ids[-3:]
+    assert body["meta"] == {
+        "count": 3,
+        "next_cursor": None,
+        "prev_cursor": ids[-3],
+    }
+
+
+def test_get_messages_walk_back_and_forward(client, session, default_data):
+    """GET /chats/1/messages with before and after cursors"""
+    ids = _add_messages(session, 5)
+
+    first_page = client.get("/chats/1/messages?limit=3").json()
+    older = client.get(
+        f"/chats/1/messages?limit=3&before={first_page['meta']['prev_cursor']}"
+    ).json()
+
+    # the default messages are dated 2021 so they sort before the new ones
+    assert [m["id"] for m in older["messages"]] == [2, ids[0], ids[1]]
+    assert older["meta"]["prev_cursor"] == 2
+    assert older["meta"]["next_cursor"] == ids[1]
+
+    newer = client.get(
+        f"/chats/1/messages?limit=3&after={older['meta']['next_cursor']}"
+    ).json()
+    assert [m["id"] for m in newer["messages"]] == ids[2:]
+    assert newer["meta"]["next_cursor"] is None
+    assert newer["meta"]["prev_cursor"] == ids[2]
+
+
+def test_get_messages_unknown_cursor(client, default_data):
+    """GET /chats/1/messages?before=404"""
+    response = client.get("/chats/1/messages?before=404")
+
+    assert response.status_code == 404
+    assert response.json()["detail"]["entity_name"] == "Message"
+
+
+def test_get_messages_both_cursors(client, default_data):
+    """GET /chats/1/messages?before=2&after=1"""
+    response = client.get("/chats/1/messages?before=2&after=1")
+
+    assert response.status_code == 422
+
+
+def _add_user_with_messages(session, user_id, count):
+    user = UserInDB(
+        id=user_id,
+        username=f"user{user_id}",
+        email=f"user{user_id}@gmail.com",
+        hashed_password="not-a-real-hash",
+    )
+    chat = ChatInDB(id=user_id, name=f"Chat {user_id}", owner_id=user_id)
+    session.add_all([user, chat, UserChatLinkInDB(user_id=user_id, chat_id=1)])
+    session.commit()
+    _add_messages(session, count, user_id=user_id)
+
+
+@pytest.mark.parametrize("url", [
+    "/chats",
+    "/chats/1?include=messages&include=users",
+    "/chats/1/messages",
+    "/chats/1/users",
+    "/users/1/chats",
+])
+def test_read_query_count_is_constant(client, session, default_data, query_counter, url):
+    """Collection reads issue the same number of queries regardless of row count"""
+    def count_queries():
+        session.expunge_all()
+        query_counter.clear()
+        assert client.get(url).status_code == 200
+        # the version stamps behind the ETag are read up front
+        return len([q for q in query_counter if "entity_versions" not in q])
+
+    baseline = count_queries()
+
+    for user_id in range(3, 8):
+        _add_user_with_messages(session, user_id, 3)
+
+    assert count_queries() == baseline
+    assert baseline <= 3
+
+
+def test_chat_counters_follow_new_messages(client, default_data):
+    """POST /chats/1/messages then GET /chats/1"""
+    response = client.post("/auth/token", data={"username": "sarah", "password": "sarahpassword"})
+    token = response.json()["access_token"]
+
+    response = client.post(
+        "/chats/1/messages",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"text": "new message"},
+    )
+    assert response.status_code == 201
+
+    response = client.get("/chats/1")
+
+    assert response.status_code == 200
+    assert response.json()["meta"] == {"message_count": 3, "user_count": 2}
+
+
+def test_get_chat_does_not_load_messages(client, default_data, query_counter):
+    """GET /chats/1 reads the counters instead of the messages"""
+    response = client.get("/chats/1")
+
+    assert response.status_code == 200
+    assert not any("FROM messages" in statement for statement in query_counter)
+
+
+def test_first_counters_of_a_chat_written_concurrently(session, default_data):
+    """A write that finds no counters, then loses the race to create them, still counts"""
+    session.exec(delete(ChatStatsInDB))
+    session.commit()
+    connection = session.connection()
+
+    def other_writer(conn, clauseelement, multiparams, params, execution_options, result):
+        # another transaction counted the chat and committed, before this write's message
+        if getattr(clauseelement, "is_update", False) and clauseelement.table.name == "chat_stats":
+            conn.exec_driver_sql(
+                "INSERT INTO chat_stats (chat_id, message_count, user_count) VALUES (1, 2, 2)"
+            )
+
+    event.listen(connection, "after_execute", other_writer)
+    try:
+        session.add(MessageInDB(id=3, text="racing", user_id=1, chat_id=1))
+        session.flush()
+        db._add_to_chat_stats(session, 1, messages=1)
+    finally:
+        event.remove(connection, "after_execute", other_writer)
+    session.commit()
+
+    stats = session.get(ChatStatsInDB, 1)
+    assert (stats.message_count, stats.user_count) == (3, 2)
+
+
+def test_reconcile_chat_stats(client, session, default_data):
+    """Reconciling repairs counters that drifted from the rows"""
+    stats = session.get(ChatStatsInDB, 1)
+    stats.message_count = 40
+    session.add(stats)
+    session.commit()
+
+    assert db.reconcile_chat_stats(session) == {"chats": 1, "repaired": 1, "repaired_last_messages": 0}
+    assert db.reconcile_chat_stats(session) == {"chats": 1, "repaired": 0, "repaired_last_messages": 0}
+
+    response = client.get("/chats/1")
+    assert response.json()["meta"] == {"message_count": 2, "user_count": 2}
+
+
+def test_get_chat_not_modified(client, default_data):
+    """GET /chats/1 with If-None-Match"""
+    response = client.get("/chats/1")
+    etag = response.headers["ETag"]
+
+    response = client.get("/chats/1", headers={"If-None-Match": f'W/{etag}, "other"'})
+    assert response.status_code == 304
+
+    # other representations of the chat have their own tags
+    response = client.get("/chats/1?include=users", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_chat_writes_change_etags(client, default_data):
+    """POST /chats/1/messages and PUT /chats/1 change the ETags they affect"""
+    chats_etag = client.get("/chats").headers["ETag"]
+    chat_etag = client.get("/chats/1").headers["ETag"]
+
+    response = client.post("/auth/token", data={"username": "sarah", "password": "sarahpassword"})
+    token = response.json()["access_token"]
+    client.post(
+        "/chats/1/messages",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"text": "new message"},
+    )
+
+    # the chat list shows every chat's latest message
+    response = client.get("/chats", headers={"If-None-Match": chats_etag})
+    assert response.status_code == 200
+    chats_etag = response.headers["ETag"]
+    response = client.get("/chats/1", headers={"If-None-Match": chat_etag})
+    assert response.status_code == 200
+    chat_etag = response.headers["ETag"]
+
+    client.put("/chats/1", json={"name": "renamed"})
+
+    assert client.get("/chats", headers={"If-None-Match": chats_etag}).status_code == 200
+    assert client.get("/chats/1", headers={"If-None-Match": chat_etag}).status_code == 200
+
+
+def test_message_payload_matches_models(client, session, default_data):
+    """GET /chats/1/messages serializes rows exactly like the Message models"""
+    _add_messages(session, 3)
+
+    response = client.get("/chats/1/messages")
+
+    expected = db.get_message_col_by_chat_id(session, 1).model_dump(mode="json")
+    assert response.json() == expected
+    assert response.json()["messages"][-1]["created_at"] == "2022-01-01T12:00:02.000002"
+
+
+def test_get_users_in_missing_chat(client, default_data):
+    """GET /chats/999/users"""
+    response = client.get("/chats/999/users")
+
+    assert response.status_code == 404
+
+
+def test_export_chat_messages(client, session, default_data, monkeypatch):
+    """GET /chats/1/export"""
+    monkeypatch.setattr(db, "EXPORT_BATCH_SIZE", 2)
+    ids = _add_messages(session, 5)
+
+    response = client.get("/chats/1/export", headers={"Accept-Encoding": "identity"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert "content-encoding" not in response.headers
+    lines = response.content.decode().splitlines()
+    messages = [json.loads(line) for line in lines]
+    assert [message["id"] for message in messages] == [1, 2, *ids]
+    assert messages[0] == {
+        "id": 1,
+        "chat_id": 1,
+        "created_at": "2021-05-06T00:00:00",
+        "text": "hello world!",
+        "user": {
+            "id": 1,
+            "username": "danbis",
+            "email": "danbis@gmail.com",
+            "created_at": "2021-05-05T00:00:00",
+        },
+    }
+
+
+def test_export_chat_messages_gzip(client, default_data):
+    """GET /chats/1/export with Accept-Encoding: gzip"""
+    response = client.get("/chats/1/export", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert [json.loads(line)["text"] for line in response.text.splitlines()] == [
+        "hello world!",
+        "Lame",
+    ]
+
+
+@pytest.mark.parametrize("accept_encoding", ["gzip;q=0", "gzip; q=0.0, identity", "*;q=0", "br, deflate"])
+def test_export_chat_messages_gzip_refused(client, default_data, accept_encoding):
+    """GET /chats/1/export with an Accept-Encoding that rules out gzip"""
+    response = client.get("/chats/1/export", headers={"Accept-Encoding": accept_encoding})
+
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert len(response.text.splitlines()) == 2
+
+
+@pytest.mark.parametrize("accept_encoding", ["GZIP;q=0.5", "br;q=1, *;q=0.1", "x-gzip"])
+def test_export_chat_messages_gzip_accepted(client, default_data, accept_encoding):
+    """GET /chats/1/export with an Accept-Encoding that allows gzip"""
+    response = client.get("/chats/1/export", headers={"Accept-Encoding": accept_encoding})
+
+    assert response.headers["content-encoding"] == "gzip"
+
+
+def test_export_missing_chat(client, default_data):
+    """GET /chats/999/export"""
+    response = client.get("/chats/999/export")
+
+    assert response.status_code == 404
+
+
+def _token(client, username="sarah", password="sarahpassword"):
+    response = client.post("/auth/token", data={"username": username, "password": password})
+    return response.json()["access_token"]
+
+
+def test_post_message_batch(client, default_data):
+    """POST /chats/1/messages:batch"""
+    response = client.post(
+        "/chats/1/messages:batch",
+        headers={"Authorization": f"Bearer {_token(client)}"},
+        json=[{"text": "one"}, {"text": "two"}, {"text": "three"}],
+    )
+
+    assert response.status_code == 201
+    assert response.json() == {"meta": {"count": 3}, "ids": [3, 4, 5]}
+
+    messages = client.get("/chats/1/messages").json()["messages"]
+    assert [(m["id"], m["text"], m["user"]["id"]) for m in messages[2:]] == [
+        (3, "one", 2),
+        (4, "two", 2),
+        (5, "three", 2),
+    ]
+    assert client.get("/chats/1").json()["meta"]["message_count"] == 5
+
+
+def test_post_message_batch_single_transaction(client, default_data, query_counter):
+    """POST /chats/1/messages:batch inserts every message with one statement"""
+    token = _token(client)
+    query_counter.clear()
+
+    response = client.post(
+        "/chats/1/messages:batch",
+        headers={"Authorization": f"Bearer {token}"},
+        json=[{"text": f"message {i}"} for i in range(50)],
+    )
+
+    assert response.status_code == 201
+    assert len([q for q in query_counter if q.startswith("INSERT INTO messages")]) == 1
+
+
+@pytest.mark.parametrize("body", [[], [{"text": "x"}] * 1001, {"text": "x"}])
+def test_post_message_batch_invalid(client, default_data, body):
+    """POST /chats/1/messages:batch with an empty, too large or non-list body"""
+    response = client.post(
+        "/chats/1/messages:batch",
+        headers={"Authorization": f"Bearer {_token(client)}"},
+        json=body,
+    )
+
+    assert response.status_code == 422
+
+
+def test_post_message_batch_missing_chat(client, default_data):
+    """POST /chats/999/messages:batch"""
+    response = client.post(
+        "/chats/999/messages:batch",
+        headers={"Authorization": f"Bearer {_token(client)}"},
+        json=[{"text": "one"}],
+    )
+
+    assert response.status_code == 404
+
+
+def test_unread_counts(client, default_data):
+    """GET /users/me/chats"""
+    headers = {"Authorization": f"Bearer {_token(client)}"}
+
+    response = client.get("/users/me/chats", headers=headers)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [chat["id"] for chat in body["chats"]] == [1]
+    # sarah's own message isn't unread
+    assert body["unread"] == [{"chat_id": 1, "last_read_message_id": None, "unread_count": 1}]
+
+
+def test_mark_chat_read(client, default_data):
+    """POST /chats/1/read"""
+    sarah = {"Authorization": f"Bearer {_token(client)}"}
+    danbis = {"Authorization": f"Bearer {_token(client, 'danbis', '123')}"}
+
+    response = client.post("/chats/1/read", headers=sarah)
+
+    assert response.status_code == 200
+    assert response.json() == {"chat_id": 1, "last_read_message_id": 2, "unread_count": 0}
+    client.post("/chats/1/messages", headers=danbis, json={"text": "unread"})
+    unread = client.get("/users/me/chats", headers=sarah).json()["unread"]
+    assert unread == [{"chat_id": 1, "last_read_message_id": 2, "unread_count": 1}]
+    # other members keep their own markers, and their own messages aren't unread
+    assert client.get("/users/me/chats", headers=danbis).json()["unread"] == [
+        {"chat_id": 1, "last_read_message_id": None, "unread_count": 1}
+    ]
+
+
+def test_own_messages_are_not_unread(client, session, default_data):
+    sarah = {"Authorization": f"Bearer {_token(client)}"}
+    client.post("/chats/1/read", headers=sarah)
+
+    client.post("/chats/1/messages", headers=sarah, json={"text": "mine"})
+    client.post("/chats/1/messages:batch", headers=sarah, json=[{"text": "one"}, {"text": "two"}])
+    db.new_message_group(session, [(1, "grouped", 2, datetime.now())])
+
+    unread = client.get("/users/me/chats", headers=sarah).json()["unread"]
+    assert unread[0]["unread_count"] == 0
+    # danbis never marked the chat read, and has everything but his own message to read
+    danbis = {"Authorization": f"Bearer {_token(client, 'danbis', '123')}"}
+    assert client.get("/users/me/chats", headers=danbis).json()["unread"][0]["unread_count"] == 5
+
+
+def test_posting_to_a_never_read_chat(client, default_data):
+    sarah = {"Authorization": f"Bearer {_token(client)}"}
+
+    client.post("/chats/1/messages", headers=sarah, json={"text": "mine"})
+
+    unread = client.get("/users/me/chats", headers=sarah).json()["unread"]
+    assert unread == [{"chat_id": 1, "last_read_message_id": None, "unread_count": 1}]
+
+
+def test_posting_keeps_unread_messages_from_others(client, default_data):
+    sarah = {"Authorization": f"Bearer {_token(client)}"}
+    danbis = {"Authorization": f"Bearer {_token(client, 'danbis', '123')}"}
+    client.post("/chats/1/read", headers=sarah, json={"message_id": 1})
+
+    client.post("/chats/1/messages", headers=danbis, json={"text": "unread"})
+    client.post("/chats/1/messages", headers=sarah, json={"text": "mine"})
+
+    unread = client.get("/users/me/chats", headers=sarah).json()["unread"]
+    assert unread == [{"chat_id": 1, "last_read_message_id": 1, "unread_count": 1}]
+    assert client.post("/chats/1/read", headers=sarah).json()["unread_count"] == 0
+
+
+def test_mark_chat_read_never_moves_back(client, default_data):
+    headers = {"Authorization": f"Bearer {_token(client)}"}
+
+    client.post("/chats/1/read", headers=headers, json={"message_id": 2})
+    response = client.post("/chats/1/read", headers=headers, json={"message_id": 1})
+
+    assert response.json() == {"chat_id": 1, "last_read_message_id": 2, "unread_count": 0}
+
+
+def test_mark_chat_read_errors(client, default_data):
+    client.post("/auth/registration", json={
+        "username": "outsider",
+        "email": "outsider@example.com",
+        "password": "outsider",
+    })
+    member = {"Authorization": f"Bearer {_token(client)}"}
+    outsider = {"Authorization": f"Bearer {_token(client, 'outsider', 'outsider')}"}
+
+    assert client.post("/chats/1/read", headers=outsider).status_code == 404
+    assert client.post("/chats/404/read", headers=member).status_code == 404
+    assert client.post("/chats/1/read", headers=member, json={"message_id": 404}).status_code == 404
+    assert client.post("/chats/1/read").status_code == 401
+
+
+def test_unread_counts_take_one_query(client, default_data, query_counter):
+    headers = {"Authorization": f"Bearer {_token(client)}"}
+    client.post("/chats/1/read", headers=headers, json={"message_id": 1})
+    # the token is cached after the first authenticated request
+    client.get("/users/me/chats", headers=headers)
+    query_counter.clear()
+
+    response = client.get("/users/me/chats", headers=headers)
+
+    # the only message after the marker is sarah's own
+    assert response.json()["unread"][0]["unread_count"] == 0
+    assert len(query_counter) == 1
+
+
+def test_chats_ordered_by_last_activity(client, session, default_data):
+    """GET /chats lists the chat with the newest message first"""
+    session.add(ChatInDB(id=2, name="Chat 2", owner_id=2, created_at=datetime(2022, 1, 1)))
+    session.add(UserChatLinkInDB(user_id=2, chat_id=2))
+    session.commit()
+    db.reconcile_chat_stats(session)
+
+    assert [chat["id"] for chat in client.get("/chats").json()["chats"]] == [2, 1]
+
+    client.post(
+        "/chats/1/messages",
+        headers={"Authorization": f"Bearer {_token(client)}"},
+        json={"text": "x" * 500},
+    )
+
+    chats = client.get("/chats").json()["chats"]
+    assert [chat["id"] for chat in chats] == [1, 2]
+    assert chats[0]["last_message"]["text"] == "x" * db.MESSAGE_PREVIEW_LENGTH
+    assert chats[0]["last_message"]["user"]["username"] == "sarah"
+    assert chats[0]["last_activity_at"] == chats[0]["last_message"]["created_at"]
+    # a chat without messages is as recent as its creation
+    assert chats[1]["last_message"] is None
+    assert chats[1]["last_activity_at"] == "2022-01-01T00:00:00"
+    assert [chat["id"] for chat in client.get("/users/2/chats").json()["chats"]] == [1, 2]
+
+
+def test_message_batch_moves_last_message(client, default_data):
+    response = client.post(
+        "/chats/1/messages:batch",
+        headers={"Authorization": f"Bearer {_token(client)}"},
+        json=[{"text": "one"}, {"text": "two"}],
+    )
+
+    last_message = client.get("/chats/1").json()["chat"]["last_message"]
+    assert last_message["id"] == response.json()["ids"][-1]
+    assert last_message["text"] == "two"
+
+
+def test_chats_are_paginated(client, session, default_data):
+    for chat_id in range(2, 6):
+        session.add(ChatInDB(
+            id=chat_id,
+            name=f"Chat {chat_id}",
+            owner_id=1,
+            created_at=datetime(2022, 1, chat_id),
+        ))
+    session.commit()
+    db.reconcile_chat_stats(session)
+
+    first = client.get("/chats?limit=2&include=total").json()
+    assert [chat["id"] for chat in first["chats"]] == [5, 4]
+    assert first["meta"] == {"count": 2, "next_cursor": 4, "total": 5}
+    second = client.get("/chats?limit=2&cursor=4").json()
+    assert [chat["id"] for chat in second["chats"]] == [3, 2]
+    last = client.get(f"/chats?limit=2&cursor={second['meta']['next_cursor']}").json()
+    assert [chat["id"] for chat in last["chats"]] == [1]
+    assert last["meta"]["next_cursor"] is None
+    assert client.get("/chats?cursor=999").status_code == 404
+
+    created = client.get("/chats?created_after=2022-01-03T00:00:00&created_before=2022-01-05T00:00:00")
+    assert [chat["id"] for chat in created.json()["chats"]] == [4, 3]
+    assert created.json()["meta"]["total"] is None
+
+
+def test_new_chats_have_an_activity_time(session, default_data):
+    """Chats created outside of the api are ordered without being reconciled"""
+    session.add(ChatInDB(id=2, name="Chat 2", owner_id=1, created_at=datetime(2022, 1, 2)))
+    session.commit()
+    session.connection().exec_driver_sql(
+        "INSERT INTO chats (id, name, owner_id, created_at) VALUES (3, 'Chat 3', 1, '2022-01-03 00:00:00')"
+    )
+    session.commit()
+
+    assert session.get(ChatInDB, 2).last_activity_at == datetime(2022, 1, 2)
+    activity = session.exec(select(ChatInDB.last_activity_at).where(ChatInDB.id == 3)).one()
+    assert activity is not None
+
+
+def test_activity_time_defaults_to_local_time(session, default_data, monkeypatch):
+    """The server default stores local time, like the timestamps written by the api"""
+    monkeypatch.setenv("TZ", "Pacific/Honolulu")  # far from UTC, without daylight saving
+    time.tzset()
+    try:
+        session.connection().exec_driver_sql(
+            "INSERT INTO chats (id, name, owner_id, created_at) VALUES (2, 'Chat 2', 1, '2022-01-02 00:00:00')"
+        )
+        session.commit()
+        activity = session.exec(select(ChatInDB.last_activity_at).where(ChatInDB.id == 2)).one()
+        assert abs(activity - datetime.now()) < timedelta(minutes=1)
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+
+def test_chats_without_messages_are_paginated(client, session):
+    """Every chat is reachable page by page, though none were reconciled"""
+    session.add(UserInDB(id=1, username="danbis", email="danbis@gmail.com", hashed_password="x"))
+    for chat_id in range(1, 6):
+        session.add(ChatInDB(id=chat_id, name=f"Chat {chat_id}", owner_id=1, created_at=datetime(2022, 1, chat_id)))
+    session.commit()
+
+    ids = []
+    params = {"limit": 2}
+    while params.get("cursor", 0) is not None:
+        page = client.get("/chats", params=params).json()
+        ids += [chat["id"] for chat in page["chats"]]
+        params["cursor"] = page["meta"]["next_cursor"]
+    assert ids == [5, 4, 3, 2, 1]
+
+
+def test_posting_leaves_the_chats_stamp_alone(client, session, default_data):
+    """Posts don't all update the one "chats" row; the list's ETag changes regardless"""
+    db.bump_entity_versions(session, "chats")
+    session.commit()
+    stamp = db.get_entity_versions(session, ["chats"])["chats"]
+    chats_etag = client.get("/chats").headers["ETag"]
+    user_chats_etag = client.get("/users/2/chats").headers["ETag"]
+
+    client.post(
+        "/chats/1/messages",
+        headers={"Authorization": f"Bearer {_token(client)}"},
+        json={"text": "new"},
+    )
+
+    assert db.get_entity_versions(session, ["chats"])["chats"] == stamp
+    assert client.get("/chats", headers={"If-None-Match": chats_etag}).status_code == 200
+    assert client.get("/users/2/chats", headers={"If-None-Match": user_chats_etag}).status_code == 200
@@ -0,0 +1,72 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend import coalescer
+from backend.coalescer import MessageCoalescer
+from backend.database import EntityNotFoundException
+from backend.schema import ChatStatsInDB
+
+
+@pytest.fixture
+def message_coalescer(session):
+    return MessageCoalescer(session.get_bind(), window_seconds=0.05, max_batch=100)
+
+
+def test_concurrent_messages_share_one_commit(session, default_data, message_coalescer, query_counter):
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        futures = list(executor.map(
+            lambda i: message_coalescer.submit(1, f"message {i}", 1 + i % 2),
+            range(10),
+        ))
+    responses = [future.result(timeout=5) for future in futures]
+
+    ids = [response.message.id for response in responses]
+    assert sorted(ids) == list(range(3, 13))
+    assert {response.message.user.id for response in responses} == {1, 2}
+    assert message_coalescer.stats() == {"pending": 0, "batches": 1, "messages": 10}
+    assert len([q for q in query_counter if q.startswith("INSERT INTO messages")]) == 1
+
+    session.expire_all()
+    assert session.get(ChatStatsInDB, 1).message_count == 12
+
+
+def test_missing_chat_fails_alone(session, default_data, message_coalescer):
+    missing = message_coalescer.submit(999, "lost", 1)
+    delivered = message_coalescer.submit(1, "delivered", 1)
+
+    assert delivered.result(timeout=5).message.text == "delivered"
+    with pytest.raises(EntityNotFoundException):
+        missing.result(timeout=5)
+
+
+def test_max_batch_flushes_early(session, default_data):
+    message_coalescer = MessageCoalescer(session.get_bind(), window_seconds=60, max_batch=2)
+
+    futures = [message_coalescer.submit(1, f"message {i}", 1) for i in range(2)]
+
+    assert [future.result(timeout=5).message.text for future in futures] == ["message 0", "message 1"]
+
+
+def test_post_message_with_group_commit(client, session, default_data, message_coalescer, monkeypatch):
+    """POST /chats/1/messages with group commit enabled"""
+    monkeypatch.setattr(coalescer, "message_coalescer", message_coalescer)
+    response = client.post("/auth/token", data={"username": "sarah", "password": "sarahpassword"})
+    token = response.json()["access_token"]
+
+    response = client.post(
+        "/chats/1/messages",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"text": "grouped"},
+    )
+
+    assert response.status_code == 201
+    assert response.json()["message"]["id"] == 3
+    assert response.json()["message"]["user"]["username"] == "sarah"
+
+    response = client.post(
+        "/chats/999/messages",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"text": "lost"},
+    )
+    assert response.status_code == 404
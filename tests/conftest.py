@@ -1,12 +1,16 @@
 import datetime
+import os
 import pytest
 from fastapi.testclient import TestClient
-from sqlmodel import Session, SQLModel, StaticPool, create_engine
+from sqlalchemy import Engine, NullPool, event
+from sqlmodel import Session, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import Optional
 from backend import auth
 from backend.routers import auths
 from backend.main import app
 from backend import database as db
+from backend.db_seeder import sync_sequences
 from backend.schema import ChatInDB, MessageInDB, UserChatLinkInDB, UserInDB
 from passlib.context import CryptContext
 
@@ -14,27 +18,64 @@ from passlib.context import CryptContext
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 @pytest.fixture
-def session():
-    engine = create_engine(
-        "sqlite://",
-        connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
-    )
+def db_path(tmp_path):
+    return tmp_path / "test.db"
+
+
+@pytest.fixture
+def database_url(db_path):
+    # set TEST_DATABASE_URL to run against e.g. a throwaway Postgres container;
+    # otherwise a SQLite file is used rather than an in-memory database so that
+    # the sync fixture session and the app's async sessions see the same data
+    return os.environ.get("TEST_DATABASE_URL", f"sqlite:///{db_path}")
+
+
+@pytest.fixture
+def session(database_url):
+    engine = db.make_engine(database_url)
+    SQLModel.metadata.drop_all(engine)
     SQLModel.metadata.create_all(engine)
     with Session(engine) as session:
+        if engine.dialect.name == "postgresql":
+            event.listen(session, "after_commit", lambda _session: sync_sequences(engine))
         yield session
+    engine.dispose()
 
 
 @pytest.fixture
-def client(session):
+def async_engine(database_url):
+    # every TestClient request runs on its own event loop, so don't pool connections
+    return db.make_async_engine(database_url, poolclass=NullPool)
+
+
+@pytest.fixture
+def client(session, async_engine):
     def _get_session_override():
         return session
 
+    async def _get_async_session_override():
+        async with AsyncSession(async_engine) as async_session:
+            yield async_session
+
     app.dependency_overrides[db.get_session] = _get_session_override
+    app.dependency_overrides[db.get_async_session] = _get_async_session_override
 
     yield TestClient(app)
 
     app.dependency_overrides.clear()
+    auths.token_cache.clear()
+
+@pytest.fixture
+def query_counter():
+    """Collects every SQL statement executed while the test runs."""
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", _record)
+    yield statements
+    event.remove(Engine, "before_cursor_execute", _record)
 
 @pytest.fixture
 def default_data(session):
@@ -84,6 +125,8 @@ def default_data(session):
     # Add created entities to session
     session.add_all([user1, user2, chat1, user_chat_link1, user_chat_link2, message1, message2])
     session.commit()
+    # counters are normally kept up to date by the writes going through the api
+    db.reconcile_chat_stats(session)
     
     # Return created entities
     return {
@@ -0,0 +1,120 @@
+import pytest
+from sqlalchemy import NullPool
+
+from backend import database as db
+
+
+def test_sqlite_pragmas_applied_per_connection(db_path):
+    engine = db.make_engine(f"sqlite:///{db_path}")
+
+    with engine.connect() as connection:
+        pragma = lambda name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+        assert pragma("journal_mode") == "wal"
+        assert pragma("synchronous") == 1  # NORMAL
+        assert pragma("busy_timeout") == 5000
+        assert pragma("cache_size") == -64 * 1024
+
+
+def test_engine_pool_options(db_path):
+    pooled = db.make_engine(f"sqlite:///{db_path}", pool_size=3)
+    unpooled = db.make_engine(f"sqlite:///{db_path}", poolclass=NullPool)
+
+    assert pooled.pool.size() == 3
+    assert isinstance(unpooled.pool, NullPool)
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("sqlite:///backend/pony_express.db", "sqlite+aiosqlite:///backend/pony_express.db"),
+    ("postgresql://pony:secret@db:5432/pony", "postgresql+asyncpg://pony:secret@db:5432/pony"),
+    ("postgresql+psycopg2://pony:secret@db/pony", "postgresql+asyncpg://pony:secret@db/pony"),
+    ("postgres://pony:secret@db/pony", "postgresql+asyncpg://pony:secret@db/pony"),
+    ("postgresql+asyncpg://pony:secret@db/pony", "postgresql+asyncpg://pony:secret@db/pony"),
+])
+def test_async_url_for(url, expected):
+    assert db.async_url_for(url) == expected
+
+
+def test_message_search_index_backfills_existing_messages(session, default_data):
+    connection = session.connection()
+    connection.exec_driver_sql("DROP TABLE messages_fts")
+    for trigger in ("insert", "delete", "update"):
+        connection.exec_driver_sql(f"DROP TRIGGER messages_fts_{trigger}")
+
+    db._create_message_search_index(connection)
+
+    assert db.search_messages(session, "hello").meta.count == 1
+
+
+def test_message_search_fallback_without_index(session, default_data):
+    hits = db._search_message_text(session, "HELLO", None, 0, 10)
+
+    assert [hit[0] for hit in hits] == [1]
+
+
+@pytest.fixture
+def fresh_engine(db_path, monkeypatch):
+    engine = db.make_engine(f"sqlite:///{db_path}")
+    monkeypatch.setattr(db, "engine", engine)
+    monkeypatch.setattr(db, "_schema_ready", False)
+    yield engine
+    engine.dispose()
+
+
+def test_create_db_and_tables_skips_current_schema(fresh_engine, monkeypatch, query_counter):
+    db.create_db_and_tables()
+    with fresh_engine.connect() as connection:
+        assert db._applied_schema_fingerprint(connection) == db.schema_fingerprint(fresh_engine.dialect)
+
+    # a new process checks the fingerprint once, later startups not at all
+    monkeypatch.setattr(db, "_schema_ready", False)
+    query_counter.clear()
+    db.create_db_and_tables()
+    assert query_counter == ["SELECT fingerprint FROM schema_version"]
+
+    query_counter.clear()
+    db.create_db_and_tables()
+    assert query_counter == []
+
+
+def test_create_db_and_tables_applies_changed_schema(fresh_engine, monkeypatch):
+    db.create_db_and_tables()
+    with fresh_engine.begin() as connection:
+        connection.exec_driver_sql("DROP INDEX ix_user_chat_links_chat_id")
+
+    monkeypatch.setattr(db, "_schema_ready", False)
+    monkeypatch.setattr(db, "schema_fingerprint", lambda dialect: "changed")
+    db.create_db_and_tables()
+
+    with fresh_engine.connect() as connection:
+        assert db._applied_schema_fingerprint(connection) == "changed"
+        indexes = connection.exec_driver_sql("PRAGMA index_list(user_chat_links)").all()
+        assert "ix_user_chat_links_chat_id" in {index[1] for index in indexes}
+
+
+def test_create_db_and_tables_adds_new_columns(fresh_engine, monkeypatch):
+    db.create_db_and_tables()
+    with fresh_engine.begin() as connection:
+        # the chats table as created before it tracked the last message
+        connection.exec_driver_sql("DROP INDEX ix_chats_last_activity_at_id")
+        connection.exec_driver_sql("ALTER TABLE chats DROP COLUMN last_message_id")
+        connection.exec_driver_sql("ALTER TABLE chats DROP COLUMN last_activity_at")
+        connection.exec_driver_sql(
+            "INSERT INTO users (id, username, email, hashed_password) VALUES (1, 'a', 'a@a', 'x')"
+        )
+        connection.exec_driver_sql("INSERT INTO chats (id, name, owner_id) VALUES (1, 'chat', 1)")
+        connection.exec_driver_sql(
+            "INSERT INTO messages (id, text, user_id, chat_id, created_at) "
+            "VALUES (7, 'hi', 1, 1, '2024-01-01 00:00:00.000000')"
+        )
+
+    monkeypatch.setattr(db, "_schema_ready", False)
+    monkeypatch.setattr(db, "schema_fingerprint", lambda dialect: "changed")
+    db.create_db_and_tables()
+
+    with fresh_engine.connect() as connection:
+        chat = connection.exec_driver_sql(
+            "SELECT last_message_id, last_activity_at FROM chats WHERE id = 1"
+        ).one()
+        indexes = connection.exec_driver_sql("PRAGMA index_list(chats)").all()
+    assert chat == (7, "2024-01-01 00:00:00.000000")
+    assert "ix_chats_last_activity_at_id" in {index[1] for index in indexes}
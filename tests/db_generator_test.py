@@ -0,0 +1,69 @@
+from collections import Counter
+
+from sqlmodel import Session, create_engine, select
+
+from backend import db_generator
+from backend.schema import ChatStatsInDB, MessageInDB, UserChatLinkInDB, UserInDB
+
+
+def _quiet(*args):
+    pass
+
+
+def _generate(engine, **options):
+    options = {"users": 200, "chats": 50, "messages": 5000, "chunk_size": 1000, **options}
+    return db_generator.generate_database(engine, progress=_quiet, **options)
+
+
+def _rows(engine, model) -> list[tuple]:
+    with Session(engine) as session:
+        return [
+            tuple(row.model_dump().items())
+            for row in session.exec(select(model)).all()
+        ]
+
+
+def test_generate_database(session):
+    engine = session.get_bind()
+
+    result = _generate(engine)
+
+    assert result["users"] == 200
+    assert result["chats"] == 50
+    assert result["messages"] == 5000
+    messages = session.exec(select(MessageInDB)).all()
+    assert len(messages) == 5000
+    links = {(link.user_id, link.chat_id) for link in session.exec(select(UserChatLinkInDB))}
+    assert len(links) == result["user_chat_links"]
+    # messages are only written by members of their chat
+    assert all((message.user_id, message.chat_id) in links for message in messages)
+    stats = session.exec(select(ChatStatsInDB)).all()
+    assert sum(chat.message_count for chat in stats) == 5000
+
+
+def test_generated_data_is_skewed(session):
+    _generate(session.get_bind())
+
+    messages = session.exec(select(MessageInDB)).all()
+    per_chat = sorted(Counter(message.chat_id for message in messages).values(), reverse=True)
+    per_user = sorted(Counter(message.user_id for message in messages).values(), reverse=True)
+    assert per_chat[0] > 10 * per_chat[len(per_chat) // 2]
+    assert sum(per_user[:20]) > sum(per_user) / 2
+    lengths = sorted(len(message.text.split()) for message in messages)
+    assert lengths[-1] > 5 * lengths[len(lengths) // 2]
+
+
+def test_generate_database_is_deterministic(session, tmp_path):
+    engine = session.get_bind()
+    other = create_engine(f"sqlite:///{tmp_path / 'other.db'}")
+
+    _generate(engine, seed=7)
+    _generate(other, seed=7)
+
+    for model in (UserInDB, UserChatLinkInDB, MessageInDB):
+        assert _rows(engine, model) == _rows(other, model)
+
+    # generating the same dataset again adds nothing
+    _generate(engine, seed=7)
+    assert len(session.exec(select(MessageInDB.id)).all()) == 5000
+    other.dispose()
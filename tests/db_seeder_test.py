@@ -0,0 +1,65 @@
+from pathlib import Path
+
+import pytest
+from sqlmodel import create_engine, select
+
+from backend import db_seeder
+from backend.schema import ChatStatsInDB, MessageInDB
+
+SEED_DB = Path(__file__).parents[1] / "backend" / "initial.db"
+
+
+@pytest.fixture(params=["attached", "streamed"])
+def source(request, monkeypatch):
+    if request.param == "streamed":
+        monkeypatch.setattr(db_seeder, "_can_attach", lambda source, target: False)
+    source = create_engine(f"sqlite:///{SEED_DB}")
+    yield source
+    source.dispose()
+
+
+def _quiet(*args):
+    pass
+
+
+def test_seed_database(session, source):
+    result = db_seeder.seed_database(source, session.get_bind(), chunk_size=50, progress=_quiet)
+
+    assert result["user_count"] == {"local": 10, "prev": 0, "additions": 10, "final": 10}
+    assert result["message_count"] == {"local": 291, "prev": 0, "additions": 291, "final": 291}
+    assert result["link_count"]["final"] == 13
+    stats = session.exec(select(ChatStatsInDB)).all()
+    assert sum(chat.message_count for chat in stats) == 291
+
+    result = db_seeder.seed_database(source, session.get_bind(), progress=_quiet)
+
+    assert result["message_count"] == {"local": 291, "prev": 291, "additions": 0, "final": 291}
+
+
+def test_seed_database_resumes_from_checkpoint(session, source, tmp_path):
+    checkpoint = tmp_path / "seed.json"
+
+    def interrupt(table, copied, total, seconds):
+        if table == "messages" and copied == 100:
+            raise KeyboardInterrupt()
+
+    with pytest.raises(KeyboardInterrupt):
+        db_seeder.seed_database(source, session.get_bind(), 50, str(checkpoint), interrupt)
+    assert checkpoint.exists()
+    assert len(session.exec(select(MessageInDB.id)).all()) == 100
+
+    resumed = []
+    result = db_seeder.seed_database(
+        source,
+        session.get_bind(),
+        50,
+        str(checkpoint),
+        lambda table, copied, total, seconds: resumed.append((table, copied)),
+    )
+
+    # finished tables and copied chunks are not read again
+    assert [copied for table, copied in resumed if table == "messages"] == [50, 100, 150, 191]
+    assert "users" not in {table for table, _ in resumed}
+    assert result["message_count"]["additions"] == 191
+    assert result["message_count"]["final"] == 291
+    assert not checkpoint.exists()
@@ -0,0 +1,149 @@
+import json
+import threading
+import time
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from backend import database as db
+from backend.routers import events
+
+
+def _login(client, username="sarah", password="sarahpassword"):
+    response = client.post("/auth/token", data={"username": username, "password": password})
+    assert response.status_code == 200
+    return response.json()["access_token"]
+
+
+def test_websocket_receives_new_message(client, default_data):
+    """WS /chats/1/ws"""
+    token = _login(client)
+
+    with client.websocket_connect(f"/chats/1/ws?token={token}") as websocket:
+        response = client.post(
+            "/chats/1/messages",
+            headers={"Authorization": f"Bearer {token}"},
+            json={"text": "live message"},
+        )
+        assert response.status_code == 201
+
+        event = websocket.receive_json()
+
+    assert event["type"] == "message"
+    assert event["message"] == response.json()["message"]
+
+
+def test_websocket_authorization_header(client, default_data):
+    """WS /chats/1/ws with an Authorization header"""
+    token = _login(client)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    with client.websocket_connect("/chats/1/ws", headers=headers) as websocket:
+        client.post("/chats/1/messages", headers=headers, json={"text": "hi"})
+        assert websocket.receive_json()["message"]["text"] == "hi"
+
+
+@pytest.mark.parametrize("url", [
+    "/chats/1/ws",
+    "/chats/1/ws?token=not-a-token",
+])
+def test_websocket_rejects_bad_token(client, default_data, url):
+    """WS /chats/1/ws without a valid token"""
+    with pytest.raises(WebSocketDisconnect) as exc_info:
+        with client.websocket_connect(url) as websocket:
+            websocket.receive_text()
+
+    assert exc_info.value.code == 1008
+
+
+def test_websocket_rejects_unknown_chat(client, default_data):
+    """WS /chats/404/ws"""
+    token = _login(client)
+
+    with pytest.raises(WebSocketDisconnect) as exc_info:
+        with client.websocket_connect(f"/chats/404/ws?token={token}") as websocket:
+            websocket.receive_text()
+
+    assert exc_info.value.code == 1008
+
+
+def _parse_sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(
+            line.split(": ", 1) for line in block.splitlines() if not line.startswith(":")
+        )
+        if "data" in fields:
+            fields["data"] = json.loads(fields["data"])
+            events.append(fields)
+    return events
+
+
+def test_event_stream_resumes_from_last_event_id(client, default_data, monkeypatch):
+    """GET /chats/1/events with Last-Event-ID"""
+    monkeypatch.setattr(events, "sse_max_stream_seconds", 0.1)
+
+    response = client.get("/chats/1/events", headers={"Last-Event-ID": "1"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    [event] = _parse_sse(response.text)
+    assert event["event"] == "message"
+    assert event["id"] == "2"
+    assert event["data"]["message"]["text"] == "Lame"
+
+
+def test_event_stream_rename_and_delete(client, session, default_data, monkeypatch):
+    """GET /chats/1/events while the chat is renamed and deleted"""
+    monkeypatch.setattr(events, "sse_max_stream_seconds", 5)
+
+    def change_chat():
+        db.update_chat_name(session, 1, "renamed")
+        db.delete_chat_by_id(session, 1)
+
+    timer = threading.Timer(0.3, change_chat)
+    timer.start()
+    response = client.get("/chats/1/events")
+    timer.join()
+
+    renamed, deleted = _parse_sse(response.text)
+    assert renamed["event"] == "chat_renamed"
+    assert renamed["data"]["chat"]["name"] == "renamed"
+    assert deleted["event"] == "chat_deleted"
+    assert deleted["data"] == {"type": "chat_deleted", "chat_id": 1}
+
+
+def test_buffered_event_stream_ends_after_backlog(client, default_data, monkeypatch):
+    """GET /chats/1/events with Last-Event-ID behind a buffering proxy"""
+    monkeypatch.setattr(events, "sse_buffered", True)
+    monkeypatch.setattr(events, "sse_max_stream_seconds", 5)
+
+    started_at = time.perf_counter()
+    response = client.get("/chats/1/events", headers={"Last-Event-ID": "1"})
+
+    assert [event["id"] for event in _parse_sse(response.text)] == ["2"]
+    assert time.perf_counter() - started_at < 1
+
+
+def test_buffered_event_stream_ends_after_first_event(client, session, default_data, monkeypatch):
+    """GET /chats/1/events behind a buffering proxy, as long polling"""
+    monkeypatch.setattr(events, "sse_buffered", True)
+    monkeypatch.setattr(events, "sse_max_stream_seconds", 5)
+
+    timer = threading.Timer(0.3, db.update_chat_name, (session, 1, "renamed"))
+    timer.start()
+    started_at = time.perf_counter()
+    response = client.get("/chats/1/events")
+    timer.join()
+
+    [renamed] = _parse_sse(response.text)
+    assert renamed["event"] == "chat_renamed"
+    assert ": keep-alive" not in response.text
+    assert time.perf_counter() - started_at < 2
+
+
+def test_event_stream_unknown_chat(client, default_data):
+    """GET /chats/404/events"""
+    response = client.get("/chats/404/events")
+
+    assert response.status_code == 404
@@ -0,0 +1,51 @@
+import threading
+
+import pytest
+
+from backend.hashing import HashingPoolFull, PasswordHasher, password_hasher
+
+
+def test_hash_and_verify():
+    hasher = PasswordHasher(max_workers=1, max_pending=1)
+
+    hashed = hasher.hash("secret")
+
+    assert hasher.verify("secret", hashed)
+    assert not hasher.verify("wrong", hashed)
+    stats = hasher.stats()
+    assert stats["completed"] == 3
+    assert stats["pending"] == 0
+    assert stats["run_seconds"] > 0
+
+
+def test_rejects_when_pending_limit_reached():
+    hasher = PasswordHasher(max_workers=1, max_pending=1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_job():
+        started.set()
+        release.wait(5)
+
+    worker = threading.Thread(target=hasher._run, args=(slow_job,))
+    worker.start()
+    started.wait(5)
+    try:
+        with pytest.raises(HashingPoolFull):
+            hasher.hash("secret")
+    finally:
+        release.set()
+        worker.join()
+
+    assert hasher.stats()["rejected"] == 1
+
+
+def test_login_returns_503_when_pool_is_full(client, default_data, monkeypatch):
+    """POST /auth/token while the hashing pool is saturated"""
+    monkeypatch.setattr(password_hasher, "max_pending", 0)
+
+    response = client.post("/auth/token", data={"username": "danbis", "password": "123"})
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert response.json()["detail"]["type"] == "service_busy"
@@ -0,0 +1,81 @@
+import pytest
+
+from backend import database as db
+from backend.schema import ChatInDB, MessageInDB, UserChatLinkInDB
+
+
+@pytest.fixture
+def search_data(session, default_data):
+    session.add(ChatInDB(id=2, name="Chat 2", owner_id=2))
+    session.add(UserChatLinkInDB(user_id=2, chat_id=2))
+    session.add_all([
+        MessageInDB(id=3, text="the pony express rides tonight", user_id=1, chat_id=1),
+        MessageInDB(id=4, text="express mail, express delivery", user_id=2, chat_id=1),
+        MessageInDB(id=5, text="an express train in chat two", user_id=2, chat_id=2),
+    ])
+    session.commit()
+
+
+def test_search_chat_messages(client, search_data):
+    """GET /chats/1/messages/search?q=express"""
+    response = client.get("/chats/1/messages/search", params={"q": "express"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["meta"]["count"] == 2
+    # the message mentioning express twice ranks first
+    assert [r["message"]["id"] for r in body["results"]] == [4, 3]
+    assert body["results"][1]["snippet"] == "the pony **express** rides tonight"
+    assert body["results"][1]["message"]["user"]["username"] == "danbis"
+
+
+def test_search_all_messages_requires_every_term(client, search_data):
+    """GET /messages/search?q=express pony"""
+    response = client.get("/messages/search", params={"q": "express pony"})
+
+    assert [r["message"]["id"] for r in response.json()["results"]] == [3]
+
+
+def test_search_pagination(client, search_data):
+    """GET /messages/search?q=express&limit=2"""
+    first = client.get("/messages/search", params={"q": "express", "limit": 2}).json()
+    second = client.get(
+        "/messages/search",
+        params={"q": "express", "limit": 2, "offset": first["meta"]["next_cursor"]},
+    ).json()
+
+    ids = [r["message"]["id"] for r in first["results"] + second["results"]]
+    assert sorted(ids) == [3, 4, 5]
+    assert second["meta"]["next_cursor"] is None
+
+
+def test_search_ignores_query_syntax(client, search_data):
+    """GET /messages/search with FTS5 operators in the query"""
+    response = client.get("/messages/search", params={"q": 'express" OR NEAR(('})
+
+    assert response.status_code == 200
+    assert response.json()["results"] == []
+
+
+def test_search_index_follows_writes(client, session, search_data):
+    """Messages are searchable as soon as they are posted, and gone once their chat is"""
+    token = client.post(
+        "/auth/token", data={"username": "danbis", "password": "123"}
+    ).json()["access_token"]
+    client.post(
+        "/chats/2/messages",
+        headers={"Authorization": f"Bearer {token}"},
+        json={"text": "zeppelin sighted"},
+    )
+    assert len(client.get("/messages/search", params={"q": "zeppelin"}).json()["results"]) == 1
+
+    db.delete_chat_by_id(session, 2)
+
+    assert client.get("/messages/search", params={"q": "zeppelin"}).json()["results"] == []
+
+
+def test_search_unknown_chat(client, search_data):
+    """GET /chats/404/messages/search"""
+    response = client.get("/chats/404/messages/search", params={"q": "express"})
+
+    assert response.status_code == 404
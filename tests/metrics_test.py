@@ -0,0 +1,84 @@
+import re
+
+from backend.metrics import MetricsRegistry, RequestMetrics
+
+
+def _sample(text: str, name: str, **labels) -> float:
+    """The value of the sample with exactly these labels, 0 if absent"""
+    rendered = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    pattern = "^" + re.escape(f"{name}{{{rendered}}}" if labels else name) + r" (\S+)$"
+    match = re.search(pattern, text, re.MULTILINE)
+    return float(match.group(1)) if match else 0
+
+
+def test_metrics_endpoint(client, default_data):
+    before = client.get("/metrics").text
+
+    assert client.get("/chats/1").status_code == 200
+    assert client.get("/chats/1").status_code == 200
+    assert client.get("/chats/404").status_code == 404
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    after = response.text
+
+    def delta(name, **labels):
+        return _sample(after, name, **labels) - _sample(before, name, **labels)
+
+    route = {"method": "GET", "route": "/chats/{chat_id}"}
+    assert delta("http_request_duration_seconds_count", **route, status="200") == 2
+    assert delta("http_request_duration_seconds_count", **route, status="404") == 1
+    assert delta("http_request_duration_seconds_bucket", **route, status="200", le="+Inf") == 2
+    assert delta("http_request_db_queries_count", **route) == 3
+    assert delta("http_request_db_queries_sum", **route) >= 3
+    assert delta("http_request_db_seconds_sum", **route) > 0
+    assert delta("db_queries_total") >= 3
+    # the scrape itself is the one request in flight
+    assert _sample(after, "http_requests_in_flight", method="GET") == 1
+    assert "# TYPE bcrypt_run_seconds_total counter" in after
+
+
+def test_unmatched_paths_share_a_label(client):
+    before = client.get("/metrics").text
+
+    client.get("/no/such/path")
+    client.get("/another/missing/path")
+
+    after = client.get("/metrics").text
+    labels = {"method": "GET", "route": "unmatched", "status": "404"}
+    assert (
+        _sample(after, "http_request_duration_seconds_count", **labels)
+        - _sample(before, "http_request_duration_seconds_count", **labels)
+    ) == 2
+    assert "/no/such/path" not in after
+
+
+def test_login_records_bcrypt_time(client, default_data):
+    before = client.get("/metrics").text
+
+    client.post("/auth/token", data={"username": "sarah", "password": "sarahpassword"})
+
+    after = client.get("/metrics").text
+    assert _sample(after, "bcrypt_jobs_completed_total") > _sample(before, "bcrypt_jobs_completed_total")
+    assert _sample(after, "bcrypt_run_seconds_total") > _sample(before, "bcrypt_run_seconds_total")
+
+
+def test_render_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    request = RequestMetrics()
+    request.queries = 2
+    for seconds in (0.001, 0.02, 3.0):
+        registry.request_started("GET")
+        registry.request_finished("GET", "/users", 200, seconds, request)
+
+    text = registry.render()
+
+    labels = {"method": "GET", "route": "/users", "status": "200"}
+    assert _sample(text, "http_request_duration_seconds_bucket", **labels, le="0.005") == 1
+    assert _sample(text, "http_request_duration_seconds_bucket", **labels, le="0.025") == 2
+    assert _sample(text, "http_request_duration_seconds_bucket", **labels, le="5.0") == 3
+    assert _sample(text, "http_request_duration_seconds_bucket", **labels, le="+Inf") == 3
+    assert _sample(text, "http_request_duration_seconds_sum", **labels) == 3.021
+    assert _sample(text, "http_request_db_queries_sum", method="GET", route="/users") == 6
+    assert _sample(text, "http_requests_in_flight", method="GET") == 0
@@ -0,0 +1,40 @@
+import json
+
+from backend import openapi
+from backend.main import app
+
+
+def test_cached_openapi_schema(client, tmp_path, monkeypatch):
+    """GET /openapi.json from a prebuilt schema"""
+    path = tmp_path / "openapi.json"
+    openapi.write_openapi(app, path)
+    cached = json.loads(path.read_text())
+    cached["schema"]["info"]["title"] = "From the cache"
+    path.write_text(json.dumps(cached))
+
+    monkeypatch.setattr(app, "openapi_schema", None)
+    monkeypatch.setattr(app, "openapi", app.openapi)
+    openapi.use_cached_openapi(app, str(path))
+
+    assert client.get("/openapi.json").json()["info"]["title"] == "From the cache"
+
+
+def test_stale_openapi_schema_is_regenerated(tmp_path):
+    path = tmp_path / "openapi.json"
+    path.write_text(json.dumps({"fingerprint": "stale", "schema": {"info": {"title": "stale"}}}))
+
+    assert openapi.load_openapi(app, path) is None
+    assert openapi.load_openapi(app, tmp_path / "missing.json") is None
+
+
+def test_source_changes_invalidate_the_schema(tmp_path):
+    (tmp_path / "routers").mkdir()
+    route = tmp_path / "routers" / "users.py"
+    route.write_text("def get_users(limit: int): ...\n")
+    before = openapi.source_fingerprint(app, tmp_path)
+
+    # e.g. a route gaining a query parameter, with its path and name unchanged
+    route.write_text("def get_users(limit: int, cursor: int = None): ...\n")
+
+    assert openapi.source_fingerprint(app, tmp_path) != before
+    assert openapi.source_fingerprint(app) == openapi.source_fingerprint(app)
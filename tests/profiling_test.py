@@ -0,0 +1,88 @@
+import logging
+
+from sqlmodel import Session, select
+
+from backend.profiling import QueryProfile, current_profile, log_profile, statement_shape
+from backend.schema import MessageInDB
+
+
+def test_profile_header(client, default_data, monkeypatch, caplog):
+    monkeypatch.setenv("PROFILE_QUERIES", "header")
+    with caplog.at_level(logging.INFO, logger="backend.profiling"):
+        response = client.get("/chats/1", headers={"X-Profile-Queries": "1"})
+
+    assert response.status_code == 200
+    assert response.headers["server-timing"].startswith("db;dur=")
+    assert "queries" in response.headers["server-timing"]
+    assert "GET /chats/1:" in caplog.text
+    assert "FROM chats" in caplog.text
+
+
+def test_not_profiled_without_header(client, default_data, monkeypatch, caplog):
+    monkeypatch.setenv("PROFILE_QUERIES", "header")
+    with caplog.at_level(logging.INFO, logger="backend.profiling"):
+        response = client.get("/chats/1")
+
+    assert "server-timing" not in response.headers
+    assert "GET /chats/1" not in caplog.text
+
+
+def test_header_ignored_by_default(client, default_data, monkeypatch, caplog):
+    monkeypatch.delenv("PROFILE_QUERIES", raising=False)
+
+    with caplog.at_level(logging.INFO, logger="backend.profiling"):
+        response = client.get("/chats/1", headers={"X-Profile-Queries": "1"})
+
+    assert "server-timing" not in response.headers
+    assert "GET /chats/1" not in caplog.text
+
+
+def test_profile_everything_from_env(client, default_data, monkeypatch):
+    monkeypatch.setenv("PROFILE_QUERIES", "all")
+    assert "server-timing" in client.get("/chats/1").headers
+
+    monkeypatch.setenv("PROFILE_QUERIES", "off")
+    assert "server-timing" not in client.get("/chats/1", headers={"X-Profile-Queries": "1"}).headers
+
+
+def test_slow_queries_are_explained(client, default_data, monkeypatch, caplog):
+    monkeypatch.setenv("PROFILE_QUERIES", "header")
+    monkeypatch.setenv("SLOW_QUERY_MS", "0")
+
+    with caplog.at_level(logging.WARNING, logger="backend.profiling"):
+        client.get("/chats/1/messages", headers={"X-Profile-Queries": "1"})
+
+    assert "slow query" in caplog.text
+    # sqlite's EXPLAIN QUERY PLAN describes every table access as a SCAN or SEARCH
+    assert "SEARCH" in caplog.text or "SCAN" in caplog.text
+
+
+def test_flags_repeated_lazy_loads(session, default_data, monkeypatch, caplog):
+    monkeypatch.setenv("PROFILE_REPEATED_QUERIES", "2")
+    profile = QueryProfile()
+    token = current_profile.set(profile)
+    try:
+        # a fresh session, so the users aren't already in the identity map
+        with Session(session.get_bind()) as fresh_session:
+            for message in fresh_session.exec(select(MessageInDB)).all():
+                message.user
+    finally:
+        current_profile.reset(token)
+
+    assert len(profile.queries) == 3
+    with caplog.at_level(logging.WARNING, logger="backend.profiling"):
+        log_profile("GET", "/example", profile)
+
+    assert "possible N+1, 2 x SELECT users." in caplog.text
+
+
+def test_statement_shape():
+    assert statement_shape("SELECT *\n  FROM users WHERE id IN (?, ?, ?)") == (
+        "SELECT * FROM users WHERE id IN (?...)"
+    )
+    assert statement_shape("SELECT * FROM users WHERE id IN (?)") == (
+        "SELECT * FROM users WHERE id IN (?...)"
+    )
+    assert statement_shape("SELECT * FROM users WHERE id IN (%(id_1_1)s, %(id_1_2)s)") == (
+        "SELECT * FROM users WHERE id IN (?...)"
+    )
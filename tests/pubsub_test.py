@@ -0,0 +1,36 @@
+import asyncio
+import json
+
+import pytest
+
+from backend.pubsub import ChatHub, SubscriberOverflow
+
+
+def test_publish_fans_out_to_chat_subscribers():
+    async def scenario():
+        hub = ChatHub()
+        with hub.subscribe(1) as first, hub.subscribe(1) as second, hub.subscribe(2) as other:
+            hub.publish(1, "message", {"message": {"id": 7}}, event_id=7)
+            events = [await asyncio.wait_for(s.get(), 1) for s in (first, second)]
+            assert other._queue.empty()
+        assert hub.subscriber_count(1) == 0
+        return events
+
+    first, second = asyncio.run(scenario())
+
+    assert first is second
+    assert first.id == 7
+    assert json.loads(first.data) == {"type": "message", "message": {"id": 7}}
+
+
+def test_slow_subscriber_overflows():
+    async def scenario():
+        hub = ChatHub(queue_size=1)
+        with hub.subscribe(1) as subscription:
+            hub.publish(1, "message", {})
+            hub.publish(1, "message", {})
+            await asyncio.sleep(0)
+            await subscription.get()
+
+    with pytest.raises(SubscriberOverflow):
+        asyncio.run(scenario())
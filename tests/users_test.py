@@ -1,8 +1,11 @@
 from datetime import datetime
+import time
 from fastapi.testclient import TestClient
 import jwt
 
 from backend.main import app
+from backend.routers.auths import TokenCache
+from backend.schema import UserInDB
 
 client = TestClient(app)
 
@@ -12,6 +15,68 @@ def test_get_all_users(client, default_data):
     response = client.get("/users")
     assert response.status_code == 200
 
+
+def _add_users(session, usernames):
+    for user_id, username in enumerate(usernames, start=1):
+        session.add(UserInDB(
+            id=user_id,
+            username=username,
+            email=f"{username}@example.com",
+            hashed_password="x",
+            created_at=datetime(2021, 1, user_id),
+        ))
+    session.commit()
+
+
+def test_users_are_paginated(client, session):
+    _add_users(session, ["erin", "bob", "dave", "alice", "carol"])
+
+    first = client.get("/users?limit=2").json()
+    assert [user["id"] for user in first["users"]] == [1, 2]
+    assert first["meta"] == {"count": 2, "next_cursor": 2, "total": None}
+
+    second = client.get(f"/users?limit=2&cursor={first['meta']['next_cursor']}").json()
+    assert [user["id"] for user in second["users"]] == [3, 4]
+    last = client.get(f"/users?limit=2&cursor={second['meta']['next_cursor']}").json()
+    assert [user["id"] for user in last["users"]] == [5]
+    assert last["meta"]["next_cursor"] is None
+
+    assert client.get("/users?limit=2&include=total").json()["meta"]["total"] == 5
+    assert client.get("/users?limit=0").status_code == 422
+    assert client.get("/users?cursor=99").status_code == 404
+
+
+def test_users_filtered_by_prefix_and_creation(client, session):
+    _add_users(session, ["carl", "bob", "carol", "Carmen", "car%", "cara"])
+
+    page = client.get("/users?username_prefix=car&limit=2&include=total").json()
+    # prefix matches are ordered by username, and case sensitive
+    assert [user["username"] for user in page["users"]] == ["car%", "cara"]
+    assert page["meta"]["total"] == 4
+    rest = client.get(
+        f"/users?username_prefix=car&cursor={page['meta']['next_cursor']}"
+    ).json()
+    assert [user["username"] for user in rest["users"]] == ["carl", "carol"]
+    # LIKE wildcards in the prefix are matched literally
+    assert [user["username"] for user in client.get("/users?username_prefix=car%25").json()["users"]] == ["car%"]
+
+    created = client.get(
+        "/users?created_after=2021-01-02T00:00:00&created_before=2021-01-04T00:00:00"
+    ).json()
+    assert [user["id"] for user in created["users"]] == [2, 3]
+
+
+def test_users_prefix_ending_in_the_highest_code_point(client, session):
+    _add_users(session, ["a\U0010ffff", "a\U0010ffffb", "b"])
+
+    response = client.get("/users", params={"username_prefix": "a\U0010ffff"})
+    assert response.status_code == 200
+    assert [user["id"] for user in response.json()["users"]] == [1, 2]
+
+    response = client.get("/users", params={"username_prefix": "\U0010ffff"})
+    assert response.status_code == 200
+    assert response.json()["users"] == []
+
 def test_create_user(client):
     create_params = {
         "username": "Danbis",
@@ -143,7 +208,19 @@ def test_get_user_chats(client, default_data):
                     "email": "danbis@gmail.com",
                     "created_at": "2021-05-05T00:00:00"
                 },
-                "created_at": "2021-05-07T00:00:00"
+                "created_at": "2021-05-07T00:00:00",
+                "last_activity_at": "2021-05-06T00:00:00",
+                "last_message": {
+                    "id": 2,
+                    "text": "Lame",
+                    "user": {
+                        "id": 2,
+                        "username": "sarah",
+                        "email": "dannith@gmail.com",
+                        "created_at": "2021-05-05T00:00:00"
+                    },
+                    "created_at": "2021-05-06T00:00:00"
+                }
             }
         ]
     }
@@ -226,3 +303,91 @@ def test_update_own_username_bad_token(client, default_data):
         json={"username": "sarah_updated"},
     )
     assert response.status_code == 401
+
+def test_authenticated_requests_use_token_cache(client, session, default_data, query_counter):
+    """GET /users/me twice with the same token"""
+    response = client.post("/auth/token", data={"username": "danbis", "password": "123"})
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert client.get("/users/me", headers=headers).status_code == 200
+    session.expunge_all()
+    query_counter.clear()
+
+    response = client.get("/users/me", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()["user"]["username"] == "danbis"
+    assert query_counter == []
+
+def test_update_own_username_invalidates_token_cache(client, default_data):
+    """PUT /users/me then GET /users/me"""
+    response = client.post("/auth/token", data={"username": "sarah", "password": "sarahpassword"})
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/users/me", headers=headers).status_code == 200
+
+    response = client.put("/users/me", headers=headers, json={"username": "sarah_updated"})
+    assert response.status_code == 200
+
+    response = client.get("/users/me", headers=headers)
+    assert response.json()["user"]["username"] == "sarah_updated"
+
+def test_get_users_not_modified(client, default_data, query_counter):
+    """GET /users with If-None-Match"""
+    etag = client.get("/users").headers["ETag"]
+    query_counter.clear()
+
+    response = client.get("/users", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+    assert all("entity_versions" in statement for statement in query_counter)
+
+def test_registration_changes_users_etag(client, default_data):
+    """POST /auth/registration then GET /users with If-None-Match"""
+    etag = client.get("/users").headers["ETag"]
+
+    response = client.post(
+        "/auth/registration",
+        json={"username": "kim", "email": "kim@gmail.com", "password": "kimpassword"},
+    )
+    assert response.status_code == 201
+
+    response = client.get("/users", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert len(response.json()["users"]) == 3
+
+def test_token_cache_expiry_and_eviction():
+    cache = TokenCache(maxsize=2, ttl=60)
+    user = UserInDB(id=1, username="danbis", email="danbis@gmail.com", hashed_password="x")
+
+    cache.put("expired", user, exp=int(time.time()) - 1)
+    cache.put("a", user, exp=int(time.time()) + 3600)
+    cache.put("b", user, exp=int(time.time()) + 3600)
+    cache.get("a")
+    cache.put("c", user, exp=int(time.time()) + 3600)
+
+    assert cache.get("expired") is None
+    assert cache.get("b") is None  # least recently used
+    assert cache.get("a").username == "danbis"
+
+    cache.invalidate_user(1)
+    assert cache.get("a") is None
+    assert cache.get("c") is None
+
+
+def test_token_cache_skips_users_changed_while_loading():
+    cache = TokenCache(maxsize=2, ttl=60)
+    user = UserInDB(id=1, username="danbis", email="danbis@gmail.com", hashed_password="x")
+
+    generation = cache.generation(1)
+    # loaded before the update, cached after its invalidation
+    cache.invalidate_user(1)
+    cache.put("a", user, exp=int(time.time()) + 3600, generation=generation)
+    assert cache.get("a") is None
+
+    cache.put("a", user, exp=int(time.time()) + 3600, generation=cache.generation(1))
+    assert cache.get("a").username == "danbis"